@@ -4,8 +4,19 @@ import os
 import datetime
 import time
 import threading
-from urllib.parse import unquote, quote
-from collections import defaultdict
+import asyncio
+import multiprocessing
+import signal
+import zlib
+import gzip
+import json
+import posixpath
+import bisect
+import queue
+import selectors
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import unquote, quote, parse_qs
+from collections import OrderedDict, namedtuple, deque
 from typing import Dict, List
 
 def get_file_icon(filename):
@@ -18,142 +29,2320 @@ def get_file_icon(filename):
         'jpg': '🖼️'
     }
     return icons.get(ext, '📄')
+
+
+class SharedCounterTable:
+    #Fixed-capacity filepath -> count table in shared memory, so forked workers see each other's hits
+    def __init__(self, capacity=4096, key_size=1024):
+        self.capacity = capacity
+        self.key_size = key_size
+        self.keys = multiprocessing.RawArray('c', capacity * key_size)
+        self.key_lengths = multiprocessing.RawArray('i', capacity)  # 0 marks an empty slot
+        self.counts = multiprocessing.RawArray('q', capacity)
+        self.insert_lock = multiprocessing.Lock()
+        self.slot_locks = [multiprocessing.Lock() for _ in range(16)]
+        self.slot_cache = {}  # per process, slots never move once assigned
+        self.dropped = multiprocessing.RawValue('q', 0)  # counts that found no slot (table full or key too long)
+
+    def find_slot(self, key, create=False):
+        slot = self.slot_cache.get(key)
+        if slot is not None:
+            return slot
+
+        key_bytes = key.encode('utf-8', 'surrogateescape')
+        if len(key_bytes) > self.key_size:
+            if not create:
+                return None
+            raise KeyError(f"key longer than {self.key_size} bytes: {key[:64]}...")
+        start = zlib.crc32(key_bytes) % self.capacity
+        for probe in range(self.capacity):
+            slot = (start + probe) % self.capacity
+            length = self.key_lengths[slot]
+            if length == 0:
+                if not create:
+                    return None
+                with self.insert_lock:
+                    # Another process may have claimed the slot while we waited
+                    if self.key_lengths[slot] == 0:
+                        offset = slot * self.key_size
+                        self.keys[offset:offset + len(key_bytes)] = key_bytes
+                        self.key_lengths[slot] = len(key_bytes)
+                        self.slot_cache[key] = slot
+                        return slot
+                length = self.key_lengths[slot]
+            offset = slot * self.key_size
+            if length == len(key_bytes) and self.keys[offset:offset + length] == key_bytes:
+                self.slot_cache[key] = slot
+                return slot
+
+        raise MemoryError("shared counter table is full")
+
+    def get(self, key, default=0):
+        slot = self.find_slot(key)
+        return default if slot is None else self.counts[slot]
+
+    def __getitem__(self, key):
+        slot = self.find_slot(key)
+        if slot is None:
+            raise KeyError(key)
+        return self.counts[slot]
+
+    def __setitem__(self, key, value):
+        try:
+            self.counts[self.find_slot(key, create=True)] = value
+        except (KeyError, MemoryError):
+            self.drop(value)
+
+    def __contains__(self, key):
+        return self.find_slot(key) is not None
+
+    def increment(self, key, amount=1):
+        # A hit that cannot be counted is only tallied, it must never fail the request
+        try:
+            slot = self.find_slot(key, create=True)
+        except (KeyError, MemoryError):
+            self.drop(amount)
+            return
+        # Striped locks - only processes hitting the same stripe ever wait for each other
+        with self.slot_locks[slot % len(self.slot_locks)]:
+            self.counts[slot] += amount
+
+    def drop(self, amount):
+        with self.insert_lock:
+            self.dropped.value += amount
+
+    def get_stats(self):
+        return {
+            'keys': sum(1 for slot in range(self.capacity) if self.key_lengths[slot]),
+            'capacity': self.capacity,
+            'dropped': self.dropped.value
+        }
+
+    def items(self):
+        items = []
+        for slot in range(self.capacity):
+            length = self.key_lengths[slot]
+            if length:
+                offset = slot * self.key_size
+                key = self.keys[offset:offset + length].decode('utf-8', 'surrogateescape')
+                items.append((key, self.counts[slot]))
+        return items
+
+    def snapshot(self):
+        return dict(self.items())
+
+
+class ShardedCounter:
+    #Hit counters split into per-thread shards - a writer only ever touches its own dict,
+    #readers merge all shards into a snapshot, so neither side waits for the other
+    def __init__(self):
+        self.local = threading.local()
+        self.shards = []  # (thread, shard dict)
+        self.retired = {}  # counts folded in from threads that have exited
+        self.registry_lock = threading.Lock()  # guards the shard list, never taken by increment
+
+    def get_shard(self):
+        shard = getattr(self.local, 'shard', None)
+        if shard is None:
+            shard = {}
+            self.local.shard = shard
+            with self.registry_lock:
+                self.fold_dead_shards()
+                self.shards.append((threading.current_thread(), shard))
+        return shard
+
+    def fold_dead_shards(self):
+        # Thread-per-request mode creates a thread per connection, so retire their shards
+        alive = []
+        for thread, shard in self.shards:
+            if thread.is_alive():
+                alive.append((thread, shard))
+            else:
+                for key, count in shard.items():
+                    self.retired[key] = self.retired.get(key, 0) + count
+        self.shards = alive
+
+    def increment(self, key, amount=1):
+        shard = self.get_shard()
+        shard[key] = shard.get(key, 0) + amount
+
+    def snapshot(self):
+        with self.registry_lock:
+            self.fold_dead_shards()
+            totals = dict(self.retired)
+            for _, shard in self.shards:
+                # dict.copy() runs under the GIL, so the owner thread cannot resize it mid-copy
+                for key, count in shard.copy().items():
+                    totals[key] = totals.get(key, 0) + count
+        return totals
+
+    def get(self, key, default=0):
+        with self.registry_lock:
+            total = self.retired.get(key, 0)
+            found = key in self.retired
+            for _, shard in self.shards:
+                count = shard.get(key)
+                if count is not None:
+                    total += count
+                    found = True
+        return total if found else default
+
+    def __setitem__(self, key, value):
+        # Only the naive demo and state restore set values directly - adjust the retired base
+        with self.registry_lock:
+            current = self.retired.get(key, 0) + sum(shard.get(key, 0) for _, shard in self.shards)
+            self.retired[key] = self.retired.get(key, 0) + value - current
+
+    def items(self):
+        return self.snapshot().items()
+
+    def get_stats(self):
+        # Per-thread dicts grow as needed, nothing is ever dropped
+        return {'keys': len(self.snapshot()), 'capacity': None, 'dropped': 0}
+
+
+class StateSnapshotter:
+    #Periodically writes server counters to <state_dir>/counters.json from a background thread
+    #Only changed state is written, with write-to-temp + os.replace so a crash never leaves half a file
+    def __init__(self, state_dir, interval=10.0, filename='counters.json'):
+        self.state_dir = state_dir
+        self.interval = interval
+        self.path = os.path.join(state_dir, filename)
+        self.last_saved = None
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.saves = 0
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f" Could not read state snapshot '{self.path}': {e}")
+            return None
+        self.last_saved = state.get('counters')
+        return state
+
+    def save(self, state):
+        os.makedirs(self.state_dir, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self.saves += 1
+
+    def save_if_changed(self, collect_state):
+        state = collect_state()
+        # saved_at always changes, so compare the counters part only
+        if state['counters'] == self.last_saved:
+            return False
+        self.save(state)
+        self.last_saved = state['counters']
+        return True
+
+    def start(self, collect_state):
+        def snapshot_loop():
+            while not self.stop_event.wait(self.interval):
+                try:
+                    self.save_if_changed(collect_state)
+                except Exception as e:
+                    print(f" Error writing state snapshot: {e}")
+
+        self.thread = threading.Thread(target=snapshot_loop, name='state-snapshotter', daemon=True)
+        self.thread.start()
+
+    def stop(self, collect_state):
+        #Stop the background thread and write one final snapshot
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=self.interval)
+        try:
+            self.save_if_changed(collect_state)
+        except Exception as e:
+            print(f" Error writing state snapshot: {e}")
+
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif')
+DOCUMENT_EXTENSIONS = ('.pdf', '.doc', '.docx', '.docs', '.txt', '.html')
+
+# /files.json ?type= value -> the get_file_kind() result it selects
+FILE_TYPE_FILTERS = {'images': 'image', 'documents': 'document', 'other': 'other'}
+
+
+def get_file_kind(name):
+    #'image', 'document' or 'other', by extension - the grouping used by /files and /files.json
+    ext = os.path.splitext(name)[1].lower()
+    if ext in IMAGE_EXTENSIONS:
+        return 'image'
+    if ext in DOCUMENT_EXTENSIONS:
+        return 'document'
+    return 'other'
+
+
+ManifestEntry = namedtuple('ManifestEntry', ['kind', 'fs_path', 'size', 'mtime_ns', 'content_type', 'children'])
+
+
+class DocumentManifest:
+    #In-memory map of every URL path under the document root -> ManifestEntry
+    #Routing and the traversal check become a dict lookup; a watcher thread rescans and swaps the map
+    #Every rescan is diffed against the previous map into a change feed of files, ordered by the generation they last changed in
+    def __init__(self, document_root, content_type_for, interval=2.0, max_tombstones=10000):
+        self.document_root = document_root
+        self.content_type_for = content_type_for
+        self.interval = interval
+        self.entries = {}
+        self.generation = 0  # bumped whenever a rescan finds a difference
+        self.last_scan_seconds = 0.0
+        self.scan_lock = threading.Lock()
+        self.file_seq = {}  # file key -> generation it last changed in
+        self.tombstones = OrderedDict()  # deleted file key -> generation it disappeared in, oldest first
+        self.max_tombstones = max_tombstones
+        self.tombstone_floor = 0  # deletions before this generation have been forgotten
+        self.change_feed = []  # sorted (seq, key, deleted) - replaced, never mutated, so readers need no lock
+        self.epoch = self.new_epoch()  # generations only mean something together with the epoch they were counted in
+        self.refresh()
+
+    def new_epoch(self):
+        # Start time in ms plus pid, both hex - unique per server run and per forked worker
+        return f"{int(time.time() * 1000):x}{os.getpid():x}"
+
+    def scan(self):
+        entries = {}
+        visited = set()  # (st_dev, st_ino) of directories, guards against symlink loops
+        pending = [('', self.document_root)]
+        while pending:
+            rel_path, fs_path = pending.pop()
+            dir_stat = os.stat(fs_path)
+            if (dir_stat.st_dev, dir_stat.st_ino) in visited:
+                continue
+            visited.add((dir_stat.st_dev, dir_stat.st_ino))
+
+            children = []
+            with os.scandir(fs_path) as it:
+                for dir_entry in it:
+                    child_rel = f"{rel_path}/{dir_entry.name}" if rel_path else dir_entry.name
+                    try:
+                        if dir_entry.is_dir():
+                            children.append((dir_entry.name, 'dir'))
+                            pending.append((child_rel, dir_entry.path))
+                        elif dir_entry.is_file():
+                            file_stat = dir_entry.stat()
+                            children.append((dir_entry.name, 'file'))
+                            entries[child_rel] = ManifestEntry('file', dir_entry.path, file_stat.st_size,
+                                                               file_stat.st_mtime_ns,
+                                                               self.content_type_for(dir_entry.name), None)
+                    except OSError:
+                        # Vanished between scandir and stat
+                        continue
+
+            children.sort()
+            entries[rel_path] = ManifestEntry('dir', fs_path, 0, dir_stat.st_mtime_ns, None, tuple(children))
+        return entries
+
+    def refresh(self):
+        #Rescan the tree, returns True if anything changed
+        with self.scan_lock:
+            started = time.perf_counter()
+            entries = self.scan()
+            self.last_scan_seconds = time.perf_counter() - started
+            if entries == self.entries:
+                return False
+            generation = self.generation + 1
+            self.update_change_feed(self.entries, entries, generation)
+            # Readers keep using the old dict until this single reference swap
+            self.entries = entries
+            # Published last - a reader that sees the new generation is guaranteed to see the new entries and feed
+            self.generation = generation
+            return True
+
+    def update_change_feed(self, old_entries, entries, generation):
+        #Stamp new and modified files with this generation and record deleted ones as tombstones
+        file_seq = {}
+        for key, entry in entries.items():
+            if entry.kind != 'file':
+                continue
+            if old_entries.get(key) == entry and key in self.file_seq:
+                file_seq[key] = self.file_seq[key]
+            else:
+                file_seq[key] = generation
+            self.tombstones.pop(key, None)
+
+        for key in self.file_seq:
+            if key not in file_seq:
+                self.tombstones[key] = generation
+        while len(self.tombstones) > self.max_tombstones:
+            _, seq = self.tombstones.popitem(last=False)
+            self.tombstone_floor = seq
+
+        feed = [(seq, key, False) for key, seq in file_seq.items()]
+        feed.extend((seq, key, True) for key, seq in self.tombstones.items())
+        feed.sort()
+        self.file_seq = file_seq
+        self.change_feed = feed
+
+    def start_watcher(self):
+        # Forked workers rescan on their own from here on, so their generations diverge - give each its own epoch
+        self.epoch = self.new_epoch()
+
+        def watch_loop():
+            while True:
+                time.sleep(self.interval)
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f" Error rescanning document root: {e}")
+
+        threading.Thread(target=watch_loop, name='manifest-watcher', daemon=True).start()
+
+    def resolve(self, requested_path):
+        #Normalise a request path to its manifest key, None if it escapes the document root
+        normalized = posixpath.normpath(requested_path)
+        if normalized == '..' or normalized.startswith('../') or normalized.startswith('/'):
+            return None
+        return '' if normalized == '.' else normalized
+
+    def lookup(self, key):
+        return self.entries.get(key)
+
+    def get_stats(self):
+        return {
+            'entries': len(self.entries),
+            'generation': self.generation,
+            'tombstones': len(self.tombstones),
+            'last_scan_ms': round(self.last_scan_seconds * 1000, 2)
+        }
+
+
+class ListingCache:
+    #Rendered directory listing templates keyed by directory, valid while the directory mtime is unchanged
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (dir mtime_ns, template)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, dir_mtime):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == dir_mtime:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, key, dir_mtime, template):
+        with self.lock:
+            self.entries[key] = (dir_mtime, template)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def get_stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+
+class NegativeCache:
+    #Bounded LRU of request paths that were not found, valid for one manifest generation
+    #Any change under the document root bumps the generation, which empties the cache on the next lookup
+    def __init__(self, max_entries=4096, max_path_length=256):
+        self.max_entries = max_entries
+        self.max_path_length = max_path_length  # longer paths are not worth remembering
+        self.entries = OrderedDict()
+        self.generation = None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.inserts = 0
+        self.invalidations = 0
+
+    def check_generation(self, generation):
+        # Caller holds lock
+        if generation != self.generation:
+            if self.entries:
+                self.entries.clear()
+                self.invalidations += 1
+            self.generation = generation
+
+    def contains(self, path, generation):
+        with self.lock:
+            self.check_generation(generation)
+            if path in self.entries:
+                self.entries.move_to_end(path)
+                self.hits += 1
+                return True
+            return False
+
+    def add(self, path, generation):
+        if len(path) > self.max_path_length:
+            return
+        with self.lock:
+            self.check_generation(generation)
+            self.entries[path] = None
+            self.entries.move_to_end(path)
+            self.inserts += 1
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'inserts': self.inserts,
+                'invalidations': self.invalidations
+            }
+
+
+class FileResponse:
+    #Response whose body is streamed from an open file with sendfile instead of being read into memory
+    def __init__(self, headers, file, offset=0, count=None, parts=None):
+        self.headers = headers  # encoded status line and headers, sent before the file
+        self.file = file
+        self.offset = offset
+        self.count = count
+        # Multipart bodies - list of literal bytes and (offset, count) file segments, in order
+        self.parts = parts
+
+    def iter_parts(self):
+        if self.parts is None:
+            yield (self.offset, self.count)
+        else:
+            yield from self.parts
+
+    def close(self):
+        self.file.close()
+
+
+class StreamResponse:
+    #Response whose body is generated while it is sent (large directory listings)
+    #chunks is an iterator of bytes; framed with chunked transfer encoding, or close-delimited for HTTP/1.0 clients
+    def __init__(self, headers, chunks, chunked=True):
+        self.headers = headers  # encoded status line and headers
+        self.chunks = chunks
+        self.chunked = chunked
+
+    def iter_body(self):
+        for chunk in self.chunks:
+            if not chunk:
+                continue
+            if self.chunked:
+                yield b'%x\r\n' % len(chunk) + chunk + b'\r\n'
+            else:
+                yield chunk
+        if self.chunked:
+            yield b'0\r\n\r\n'
+
+    def close(self):
+        close = getattr(self.chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def gzip_stream(chunks, level=6):
+    #Compress an iterator of byte chunks into one gzip stream, flushing after every chunk so output keeps flowing
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class HTTPRequest:
+    #Parsed request line and headers, header names are stored lower-cased
+    #path is unquoted without the leading '/', query is the raw text after '?'
+    def __init__(self, method, path, version, headers, query=''):
+        self.method = method
+        self.path = path
+        self.version = version
+        self.headers = headers
+        self.query = query
+
+    def get_target(self):
+        #Request target as the client sent it (unquoted)
+        return f"/{self.path}?{self.query}" if self.query else f"/{self.path}"
+
+    def get_log_line(self):
+        #Request line for access and slow logs, escaped with LOG_ESCAPES
+        return f"{self.method} {self.get_target()} {self.version}".translate(LOG_ESCAPES)
+
+    def get_header(self, name, default=None):
+        return self.headers.get(name.lower(), default)
+
+
+class HTTPParseError(Exception):
+    #Malformed or oversized request, carries the status to answer with
+    def __init__(self, status_code, status_message):
+        super().__init__(f"{status_code} {status_message}")
+        self.status_code = status_code
+        self.status_message = status_message
+
+
+class ConnectionDeadlineExceeded(Exception):
+    #A client stalled past the header, body or send deadline - the connection is dropped
+    def __init__(self, phase):
+        super().__init__(f"{phase} deadline exceeded")
+        self.phase = phase
+
+
+class HTTPRequestParser:
+    #Incremental byte-level HTTP/1.1 request parser for one connection
+    #feed() takes whatever recv returned and gives back every request completed so far,
+    #so partial reads, split headers and pipelined requests are all handled the same way
+    def __init__(self, max_header_bytes=8192, max_headers=100, max_body_bytes=1024 * 1024):
+        self.max_header_bytes = max_header_bytes
+        self.max_headers = max_headers
+        self.max_body_bytes = max_body_bytes
+        self.buffer = bytearray()
+        self.scan_from = 0  # where to resume looking for the end of the header block
+        self.body_remaining = 0  # request body bytes still to be skipped
+
+    def has_partial_request(self):
+        return bool(self.buffer) or self.body_remaining > 0
+
+    def feed(self, data):
+        self.buffer += data
+        requests = []
+        while True:
+            if self.body_remaining:
+                # Only GET/HEAD are served, so request bodies are skipped rather than stored
+                skipped = min(self.body_remaining, len(self.buffer))
+                del self.buffer[:skipped]
+                self.body_remaining -= skipped
+                if self.body_remaining:
+                    break
+
+            request = self.parse_next()
+            if request is None:
+                break
+            requests.append(request)
+        return requests
+
+    def parse_next(self):
+        # Leading empty lines between pipelined requests are allowed (RFC 9112 2.2)
+        while self.buffer[:2] == b'\r\n':
+            del self.buffer[:2]
+        while self.buffer[:1] == b'\n':
+            del self.buffer[:1]
+
+        end, separator_length = self.find_header_end()
+        if end < 0:
+            if len(self.buffer) > self.max_header_bytes:
+                raise HTTPParseError(431, "Request Header Fields Too Large")
+            return None
+        if end > self.max_header_bytes:
+            raise HTTPParseError(431, "Request Header Fields Too Large")
+
+        header_block = bytes(self.buffer[:end])
+        del self.buffer[:end + separator_length]
+        self.scan_from = 0
+
+        lines = header_block.split(b'\n')
+        if len(lines) - 1 > self.max_headers:
+            raise HTTPParseError(431, "Request Header Fields Too Large")
+
+        parts = lines[0].strip().split(b' ')
+        if len(parts) < 2:
+            raise HTTPParseError(400, "Bad Request")
+        method = parts[0].decode('ascii', 'replace')
+        version = parts[2].decode('ascii', 'replace') if len(parts) > 2 else 'HTTP/1.0'
+
+        target, _, query = parts[1].decode('utf-8', 'surrogateescape').partition('?')
+        path = unquote(target)
+        if path.startswith('/'):
+            path = path[1:]
+        if not path:
+            path = 'index.html'
+
+        headers = {}
+        for line in lines[1:]:
+            name, separator, value = line.partition(b':')
+            if not separator:
+                continue
+            name = name.strip().decode('latin-1').lower()
+            value = value.strip().decode('latin-1')
+            if name in headers:
+                # Repeated fields fold into a comma separated list
+                headers[name] = f"{headers[name]}, {value}"
+            else:
+                headers[name] = value
+
+        if 'transfer-encoding' in headers:
+            raise HTTPParseError(501, "Not Implemented")
+        content_length = headers.get('content-length')
+        if content_length:
+            try:
+                self.body_remaining = int(content_length)
+            except ValueError:
+                raise HTTPParseError(400, "Bad Request")
+            if self.body_remaining < 0:
+                raise HTTPParseError(400, "Bad Request")
+            if self.body_remaining > self.max_body_bytes:
+                raise HTTPParseError(413, "Payload Too Large")
+
+        return HTTPRequest(method, path, version, headers, query)
+
+    def find_header_end(self):
+        #Index of the blank line ending the header block and the length of that separator
+        start = max(self.scan_from - 3, 0)
+        crlf = self.buffer.find(b'\r\n\r\n', start)
+        lf = self.buffer.find(b'\n\n', start)
+        # Nothing found yet - next time only scan the newly arrived bytes
+        self.scan_from = len(self.buffer)
+        if crlf >= 0 and (lf < 0 or crlf < lf):
+            return crlf, 4
+        if lf >= 0:
+            return lf, 2
+        return -1, 0
+
+
+class IdleConnectionMonitor:
+    #Parks sockets that have nothing to read (new connections, idle keep-alive ones) in a selector instead of a worker thread
+    #When a parked socket turns readable it is dispatched back to the pool, silent ones are closed on timeout
+    def __init__(self, dispatch, idle_timeout):
+        self.dispatch = dispatch
+        self.idle_timeout = idle_timeout
+        self.selector = None  # selector and wakeup pipe are created by start()
+        self.wakeup_reader = self.wakeup_writer = None
+        self.pending = queue.SimpleQueue()  # sockets handed over by workers, registered by the monitor thread
+        self.deadlines = {}  # socket -> (monotonic deadline, kind)
+        self.timeouts = {'idle': 0, 'header': 0}
+
+    def park(self, client_socket, state, timeout=None, kind='idle'):
+        #kind 'idle' is a keep-alive connection between requests, 'header' a new one that has not sent anything yet
+        self.pending.put((client_socket, state, timeout or self.idle_timeout, kind))
+        try:
+            self.wakeup_writer.send(b'\0')
+        except OSError:
+            # Wakeup pipe already full - the monitor is about to run anyway
+            pass
+
+    def start(self):
+        # Created here rather than in __init__ so forked workers each get their own epoll fd and wakeup pipe
+        self.selector = selectors.DefaultSelector()
+        self.wakeup_reader, self.wakeup_writer = socket.socketpair()
+        self.wakeup_reader.setblocking(False)
+        self.wakeup_writer.setblocking(False)
+        self.selector.register(self.wakeup_reader, selectors.EVENT_READ, None)
+        threading.Thread(target=self.run, name='keep-alive-monitor', daemon=True).start()
+
+    def run(self):
+        while True:
+            while True:
+                try:
+                    client_socket, state, timeout, kind = self.pending.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    self.selector.register(client_socket, selectors.EVENT_READ, state)
+                except (OSError, ValueError) as e:
+                    # Already closed by the peer or the worker - nothing to wait for
+                    print(f" Keep-alive monitor could not park connection: {e}")
+                    client_socket.close()
+                    continue
+                self.deadlines[client_socket] = (time.monotonic() + timeout, kind)
+
+            # Every new and idle connection goes through this thread, so one bad socket must not stop it
+            for key, _ in self.selector.select(timeout=0.5):
+                if key.data is None:
+                    try:
+                        self.wakeup_reader.recv(4096)
+                    except OSError:
+                        pass
+                    continue
+                self.release(key.fileobj)
+                try:
+                    self.dispatch(key.fileobj, key.data)
+                except Exception as e:
+                    # e.g. "can't start new thread" in thread-per-request mode
+                    print(f" Keep-alive monitor could not dispatch connection: {e}")
+                    key.fileobj.close()
+
+            now = time.monotonic()
+            for client_socket, (deadline, kind) in list(self.deadlines.items()):
+                if deadline <= now:
+                    self.release(client_socket)
+                    client_socket.close()
+                    self.timeouts[kind] += 1
+
+    def release(self, client_socket):
+        #Stop watching a socket, tolerating one that was closed behind the selector's back
+        self.deadlines.pop(client_socket, None)
+        try:
+            self.selector.unregister(client_socket)
+        except (KeyError, ValueError, OSError):
+            pass
+
+    def get_stats(self):
+        return {
+            'idle_connections': len(self.deadlines),
+            'idle_timeouts': self.timeouts['idle'],
+            'header_timeouts': self.timeouts['header']
+        }
+
+
+class WorkerPool:
+    #Worker threads behind a bounded admission queue, sized between min_workers and max_workers
+    #submit() refuses work when the queue is full, and jobs that waited longer than max_queue_wait are shed instead of run
+    #A scaler thread adds workers while the oldest queued job has waited longer than target_wait, idle workers retire after idle_timeout
+    def __init__(self, min_workers, max_workers=None, max_queue=100, max_queue_wait=10.0,
+                 target_wait=0.1, idle_timeout=30.0, scale_interval=0.25):
+        self.min_workers = min_workers
+        self.max_workers = max(max_workers or min_workers, min_workers)
+        self.max_queue = max_queue
+        self.max_queue_wait = max_queue_wait
+        self.target_wait = target_wait
+        self.idle_timeout = idle_timeout
+        self.scale_interval = scale_interval
+        self.jobs = queue.Queue(maxsize=max_queue)
+        self.threads = []
+        self.next_thread_id = 0
+        self.stats_lock = threading.Lock()
+        self.workers = 0
+        self.busy = 0
+        self.completed = 0
+        self.rejected_full = 0
+        self.shed_expired = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.decisions = deque(maxlen=20)  # most recent scaling decisions, newest last
+        self.stopping = threading.Event()  # stops the scaler before shutdown() queues the worker sentinels
+
+    def start(self):
+        # Threads are started lazily so forked workers get their own
+        with self.stats_lock:
+            self.add_workers(self.min_workers)
+        if self.max_workers > self.min_workers:
+            threading.Thread(target=self.run_scaler, name='pool-scaler', daemon=True).start()
+
+    def add_workers(self, count):
+        # Caller holds stats_lock
+        for _ in range(count):
+            thread = threading.Thread(target=self.run, name=f'worker-{self.next_thread_id}', daemon=True)
+            self.next_thread_id += 1
+            self.workers += 1
+            self.threads.append(thread)
+            thread.start()
+
+    def record_decision(self, action, reason):
+        # Caller holds stats_lock
+        self.decisions.append({
+            'time': datetime.datetime.now().isoformat(timespec='seconds'),
+            'action': action,
+            'workers': self.workers,
+            'reason': reason
+        })
+        print(f" Pool {action} to {self.workers} workers ({reason})")
+
+    def head_wait(self):
+        #How long the oldest queued job has been waiting, 0 when the queue is empty
+        with self.jobs.mutex:
+            for item in self.jobs.queue:
+                # None is a shutdown sentinel, not a job
+                if item is not None:
+                    return time.monotonic() - item[0]
+            return 0.0
+
+    def run_scaler(self):
+        while not self.stopping.wait(self.scale_interval):
+            waited = self.head_wait()
+            if waited <= self.target_wait:
+                continue
+            with self.stats_lock:
+                if self.workers >= self.max_workers:
+                    continue
+                # Add roughly one worker per queued job, the queue drains within one handler time
+                grow = min(self.max_workers - self.workers, max(1, self.jobs.qsize()))
+                self.add_workers(grow)
+                self.record_decision('grew', f'queue wait {waited * 1000:.0f} ms > target {self.target_wait * 1000:.0f} ms, depth {self.jobs.qsize()}')
+
+    def submit(self, job, shed, *args):
+        #Queue job(*args), returns False right away when the queue is full
+        try:
+            self.jobs.put_nowait((time.monotonic(), job, shed, args))
+        except queue.Full:
+            with self.stats_lock:
+                self.rejected_full += 1
+            return False
+        return True
+
+    def run(self):
+        while True:
+            try:
+                item = self.jobs.get(timeout=self.idle_timeout if self.max_workers > self.min_workers else None)
+            except queue.Empty:
+                with self.stats_lock:
+                    if self.workers > self.min_workers:
+                        self.workers -= 1
+                        self.threads.remove(threading.current_thread())
+                        self.record_decision('shrank', f'worker idle for {self.idle_timeout:g} s')
+                        return
+                continue
+            if item is None:
+                return
+            enqueued_at, job, shed, args = item
+            waited = time.monotonic() - enqueued_at
+            expired = self.max_queue_wait > 0 and waited > self.max_queue_wait
+            with self.stats_lock:
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+                if expired:
+                    self.shed_expired += 1
+                else:
+                    self.busy += 1
+            if expired:
+                # The client has waited long enough - answer with a cheap 503 instead of doing the work
+                shed(*args)
+                continue
+            try:
+                job(*args)
+            except Exception as e:
+                print(f" Worker error: {e}")
+            finally:
+                with self.stats_lock:
+                    self.busy -= 1
+                    self.completed += 1
+
+    def shutdown(self):
+        self.stopping.set()
+        with self.stats_lock:
+            threads = list(self.threads)
+        for _ in threads:
+            self.jobs.put(None)
+        for thread in threads:
+            thread.join()
+
+    def get_stats(self):
+        with self.stats_lock:
+            dequeued = self.completed + self.busy + self.shed_expired
+            return {
+                'workers': self.workers,
+                'min_workers': self.min_workers,
+                'max_workers': self.max_workers,
+                'busy': self.busy,
+                'queue_depth': self.jobs.qsize(),
+                'max_queue': self.max_queue,
+                'max_queue_wait_s': self.max_queue_wait,
+                'target_wait_ms': round(self.target_wait * 1000, 2),
+                'head_wait_ms': round(self.head_wait() * 1000, 2),
+                'avg_wait_ms': round(self.total_wait / dequeued * 1000, 2) if dequeued else 0.0,
+                'max_wait_ms': round(self.max_wait * 1000, 2),
+                'completed': self.completed,
+                'rejected_full': self.rejected_full,
+                'shed_expired': self.shed_expired,
+                'scaling': list(self.decisions)
+            }
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestMetrics:
+    #Request counters and latency histograms for /metrics, stored as flat string keys in a counter table
+    #With ShardedCounter every observation is a few dict updates on the calling thread's own shard
+    def __init__(self, counters):
+        self.counters = counters  # ShardedCounter, or SharedCounterTable when forked
+
+    def request_started(self):
+        self.counters.increment('in_flight')
+
+    def observe(self, route, status, seconds, bytes_sent, in_flight=True):
+        #Record one finished request, in_flight=False for requests rejected before request_started()
+        counters = self.counters
+        if in_flight:
+            counters.increment('in_flight', -1)
+        counters.increment(f'requests|{route}|{status}')
+        counters.increment(f'bucket|{route}|{bisect.bisect_left(LATENCY_BUCKETS, seconds)}')
+        counters.increment(f'duration_us|{route}', int(seconds * 1000000))
+        counters.increment(f'bytes|{route}', bytes_sent)
+
+    def render(self, gauges):
+        #Prometheus text exposition format, gauges is a list of (name, help, type, value) added as-is
+        requests = []
+        buckets = {}
+        durations = {}
+        sent = []
+        in_flight = 0
+        for key, value in sorted(self.counters.snapshot().items()):
+            kind, _, rest = key.partition('|')
+            if kind == 'in_flight':
+                in_flight = value
+            elif kind == 'requests':
+                route, status = rest.rsplit('|', 1)
+                requests.append((route, status, value))
+            elif kind == 'bucket':
+                route, index = rest.rsplit('|', 1)
+                buckets.setdefault(route, [0] * (len(LATENCY_BUCKETS) + 1))[int(index)] += value
+            elif kind == 'duration_us':
+                durations[rest] = value
+            elif kind == 'bytes':
+                sent.append((rest, value))
+
+        lines = [
+            '# HELP http_requests_total Requests answered, by route and status code.',
+            '# TYPE http_requests_total counter'
+        ]
+        for route, status, value in requests:
+            lines.append(f'http_requests_total{{route="{route}",status="{status}"}} {value}')
+
+        lines.append('# HELP http_request_duration_seconds Time from picking up a request to sending the last byte.')
+        lines.append('# TYPE http_request_duration_seconds histogram')
+        for route, counts in buckets.items():
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, counts):
+                cumulative += count
+                lines.append(f'http_request_duration_seconds_bucket{{route="{route}",le="{bound}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'http_request_duration_seconds_bucket{{route="{route}",le="+Inf"}} {cumulative}')
+            lines.append(f'http_request_duration_seconds_sum{{route="{route}"}} {durations.get(route, 0) / 1000000}')
+            lines.append(f'http_request_duration_seconds_count{{route="{route}"}} {cumulative}')
+
+        lines.append('# HELP http_response_bytes_total Bytes sent, headers included.')
+        lines.append('# TYPE http_response_bytes_total counter')
+        for route, value in sent:
+            lines.append(f'http_response_bytes_total{{route="{route}"}} {value}')
+
+        lines.append('# HELP http_requests_in_flight Requests currently being handled.')
+        lines.append('# TYPE http_requests_in_flight gauge')
+        lines.append(f'http_requests_in_flight {in_flight}')
+
+        for name, help_text, metric_type, value in gauges:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+class PhaseTimer:
+    #Splits one request's wall time into named phases (queue, recv, rate, delay, fs, send)
+    __slots__ = ('started', 'mark', 'phases')
+
+    def __init__(self, started=None):
+        self.started = self.mark = started if started is not None else time.perf_counter()
+        self.phases = []
+
+    def lap(self, name):
+        #Close the current phase under this name and start the next one
+        now = time.perf_counter()
+        self.phases.append((name, now - self.mark))
+        self.mark = now
+
+    def total(self):
+        return self.mark - self.started
+
+    def header_value(self):
+        return ', '.join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.phases)
+
+    def describe(self):
+        return ' '.join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in self.phases)
+
+
+LOG_LEVELS = {'quiet': 0, 'access': 1, 'debug': 2}
+
+# Apache-style escaping of the request line in logs, so a decoded %0a or %22 cannot forge another record
+# (control characters and undecodable bytes become \xhh, " and \ are backslash-escaped)
+LOG_ESCAPES = {code: f'\\x{code:02x}' for code in (*range(0x20), *range(0x7f, 0xa0))}
+LOG_ESCAPES.update({code: f'\\x{code - 0xdc00:02x}' for code in range(0xdc80, 0xdd00)})
+LOG_ESCAPES.update({ord('"'): '\\"', ord('\\'): '\\\\'})
+
+
+class AccessLogger:
+    #Request threads only enqueue raw tuples; one background thread formats Common Log Format lines
+    #and writes them in batches to a file or stdout. The queue is bounded - when it is full lines are dropped, not waited for
+    #Levels: quiet (nothing), access (one CLF line per request plus notices), debug (also per-connection lines)
+    def __init__(self, level='access', path=None, max_queue=10000, batch_size=256, flush_interval=0.5):
+        if level not in LOG_LEVELS:
+            raise ValueError(f"unknown log level '{level}', expected one of {', '.join(LOG_LEVELS)}")
+        self.level = LOG_LEVELS[level]
+        self.level_name = level
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.records = queue.Queue(maxsize=max_queue)
+        self.thread = None
+        self.written = 0
+        self.dropped = 0
+        self.access_enabled = self.level >= LOG_LEVELS['access']
+        self.debug_enabled = self.level >= LOG_LEVELS['debug']
+
+    def enqueue(self, record):
+        try:
+            self.records.put_nowait(record)
+        except queue.Full:
+            # Unlocked increment - an approximate drop count is fine here
+            self.dropped += 1
+
+    def access(self, client_ip, request, status, size):
+        if self.access_enabled:
+            self.enqueue(('access', time.time(), client_ip, request, status, size))
+
+    def notice(self, message, *args):
+        #Operational messages (rate limiting, shedding, slow requests), formatted on the logger thread
+        if self.access_enabled:
+            self.enqueue(('message', message, args))
+
+    def debug(self, message, *args):
+        if self.debug_enabled:
+            self.enqueue(('message', message, args))
+
+    def format_record(self, record):
+        if record[0] == 'message':
+            return ' ' + record[1].format(*record[2])
+        _, timestamp, client_ip, request, status, size = record
+        when = time.strftime('%d/%b/%Y:%H:%M:%S %z', time.localtime(timestamp))
+        request_line = request.get_log_line() if request is not None else '-'
+        return f'{client_ip} - - [{when}] "{request_line}" {status} {size if size else "-"}'
+
+    def start(self):
+        if self.level == 0:
+            return
+        self.thread = threading.Thread(target=self.run, name='access-logger', daemon=True)
+        self.thread.start()
+
+    def run(self):
+        output = open(self.path, 'a', encoding='utf-8') if self.path else sys.stdout
+        while True:
+            try:
+                batch = [self.records.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.records.get_nowait())
+                except queue.Empty:
+                    break
+            # Records logged after stop() land behind the sentinel, so it can be anywhere in the batch
+            stop = None in batch
+            if stop:
+                batch = [record for record in batch if record is not None]
+            try:
+                output.write(''.join(self.format_record(record) + '\n' for record in batch))
+                output.flush()
+                self.written += len(batch)
+            except Exception as e:
+                print(f" Error writing access log: {e}")
+            if stop:
+                return
+
+    def stop(self):
+        #Flush whatever is queued and stop the logger thread
+        if self.thread is None:
+            return
+        self.records.put(None)
+        self.thread.join(timeout=5)
+        self.thread = None
+
+    def get_stats(self):
+        return {
+            'level': self.level_name,
+            'queued': self.records.qsize(),
+            'written': self.written,
+            'dropped': self.dropped
+        }
+
+
+class SlowRequestLog:
+    #Requests slower than threshold seconds with their phase breakdown, one line each
+    #Written to a file when a path is given, otherwise handed to the access logger (notice) with the rest of the output
+    def __init__(self, threshold, path=None, notice=None):
+        self.threshold = threshold
+        self.path = path
+        self.notice = notice or print
+        self.lock = threading.Lock()
+        self.logged = 0
+
+    def record(self, timer, client_ip, request, status):
+        total = timer.total()
+        if self.threshold < 0 or total < self.threshold:
+            return
+        line = (
+            f"{datetime.datetime.now().isoformat(timespec='milliseconds')} {client_ip} "
+            f"\"{request.get_log_line()}\" {status} "
+            f"total={total * 1000:.1f}ms {timer.describe()}"
+        )
+        with self.lock:
+            self.logged += 1
+            if self.path is None:
+                self.notice("SLOW {}", line)
+                return
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+
+
+# Receive buffers are per worker thread and reused for every connection it handles
+recv_buffers = threading.local()
+
+
+def get_recv_buffer(size=16384):
+    view = getattr(recv_buffers, 'view', None)
+    if view is None:
+        view = memoryview(bytearray(size))
+        recv_buffers.view = view
+    return view
+
+
+class FileCache:
+    #Byte-budgeted LRU of pre-encoded responses (headers + body), revalidated against st_mtime/st_size
+    def __init__(self, max_bytes=32 * 1024 * 1024, max_entry_size=1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_entry_size = max_entry_size
+        self.entries = OrderedDict()  # key -> (mtime_ns, size, response bytes)
+        self.current_bytes = 0
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, stat_result):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[0] == stat_result.st_mtime_ns and entry[1] == stat_result.st_size:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[2]
+                # File changed on disk since it was cached
+                self.remove_entry(key)
+            self.misses += 1
+            return None
+
+    def put(self, key, stat_result, response):
+        if len(response) > self.max_entry_size or len(response) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.remove_entry(key)
+            self.entries[key] = (stat_result.st_mtime_ns, stat_result.st_size, response)
+            self.current_bytes += len(response)
+
+            while self.current_bytes > self.max_bytes:
+                _, (_, _, evicted) = self.entries.popitem(last=False)
+                self.current_bytes -= len(evicted)
+                self.evictions += 1
+
+    def remove_entry(self, key):
+        _, _, response = self.entries.pop(key)
+        self.current_bytes -= len(response)
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+class Flight:
+    #One in-progress SingleFlight call; waiters block on done and then read result or error
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    #Coalesces concurrent calls for the same key - the first caller runs the function, the others wait for its result
+    #Nothing is remembered once the call returns, caching the result is left to the function
+    def __init__(self):
+        self.calls = {}  # key -> Flight
+        self.lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key, fn, *args):
+        with self.lock:
+            flight = self.calls.get(key)
+            if flight is None:
+                flight = self.calls[key] = Flight()
+                self.leaders += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn(*args)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            flight.done.set()
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'in_flight': len(self.calls),
+                'leaders': self.leaders,
+                'coalesced': self.coalesced
+            }
+
+
+class TokenBucketRateLimiter:
+    #Per-IP token bucket - O(1) per request, a few floats per client, locks sharded by IP hash
+    def __init__(self, rate=5, burst=None, shards=16, idle_timeout=60.0, shared_blocked=None):
+        self.rate = rate  # tokens refilled per second
+        self.burst = burst or rate  # bucket capacity
+        self.idle_timeout = idle_timeout
+        # Each shard: ip -> [tokens, last_seen, blocked]
+        self.shards = [({}, threading.Lock()) for _ in range(shards)]
+
+        # Blocks of clients that were evicted, so the totals survive eviction
+        self.evicted_blocked = 0
+        self.evicted_lock = threading.Lock()
+
+        # Multi-process mode - every block is also added to this shared total, which then is the reported one
+        self.shared_blocked = shared_blocked
+
+    def allow(self, client_ip):
+        buckets, lock = self.shards[hash(client_ip) % len(self.shards)]
+        now = time.monotonic()
+        with lock:
+            bucket = buckets.get(client_ip)
+            if bucket is None:
+                buckets[client_ip] = [self.burst - 1, now, 0]
+                return True
+
+            tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if tokens < 1:
+                bucket[0] = tokens
+                bucket[2] += 1
+                if self.shared_blocked is not None:
+                    with self.shared_blocked.get_lock():
+                        self.shared_blocked.value += 1
+                return False
+            bucket[0] = tokens - 1
+            return True
+
+    def evict_idle(self):
+        #Drop clients idle for longer than idle_timeout - their bucket is full again anyway
+        cutoff = time.monotonic() - self.idle_timeout
+        evicted = 0
+        for buckets, lock in self.shards:
+            with lock:
+                idle = [ip for ip, bucket in buckets.items() if bucket[1] < cutoff]
+                for ip in idle:
+                    blocked = buckets.pop(ip)[2]
+                    if blocked:
+                        with self.evicted_lock:
+                            self.evicted_blocked += blocked
+                evicted += len(idle)
+        return evicted
+
+    def start_evictor(self):
+        def evict_loop():
+            while True:
+                time.sleep(self.idle_timeout / 2)
+                self.evict_idle()
+
+        threading.Thread(target=evict_loop, name='rate-limit-evictor', daemon=True).start()
+
+    def get_blocked_per_ip(self):
+        blocked = {}
+        for buckets, lock in self.shards:
+            with lock:
+                for ip, bucket in buckets.items():
+                    if bucket[2] > 0:
+                        blocked[ip] = bucket[2]
+        return blocked
+
+    def get_stats(self):
+        tracked = 0
+        blocked = 0
+        for buckets, lock in self.shards:
+            with lock:
+                tracked += len(buckets)
+                blocked += sum(bucket[2] for bucket in buckets.values())
+        with self.evicted_lock:
+            blocked += self.evicted_blocked
+        if self.shared_blocked is not None:
+            # Includes the blocks of every worker process (and of earlier runs)
+            blocked = self.shared_blocked.value
+        return {'tracked_ips': tracked, 'blocked_total': blocked, 'rate': self.rate, 'burst': self.burst}
+
+    def restore_blocked(self, total):
+        #Blocks of previous runs count like those of evicted clients
+        if self.shared_blocked is not None:
+            with self.shared_blocked.get_lock():
+                self.shared_blocked.value = total
+        else:
+            with self.evicted_lock:
+                self.evicted_blocked = total
+
+
+MAX_RANGES = 16
+
+# Listings with more visible entries than this are streamed instead of cached as one page
+LISTING_STREAM_THRESHOLD = 1000
+LISTING_BATCH_SIZE = 256  # entries rendered per streamed chunk
+LISTING_SORT_KEYS = ('name', 'size', 'mtime')
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+GZIP_LEVEL_STATIC = 9   # static files are compressed once and cached, so spend the CPU
+GZIP_LEVEL_DYNAMIC = 5  # dynamic bodies are compressed on every request
+
+
+def is_compressible(content_type):
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def accepts_gzip(request):
+    #True if Accept-Encoding allows gzip (explicitly or through *) with a non-zero q-value
+    if request is None:
+        return False
+    accept_encoding = request.get_header('Accept-Encoding')
+    if not accept_encoding:
+        return False
+    wildcard = False
+    for item in accept_encoding.lower().split(','):
+        coding, _, params = item.strip().partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if coding.strip() == 'gzip':
+            return q > 0
+        if coding.strip() == '*':
+            wildcard = q > 0
+    return wildcard
+
+
+def parse_range_header(range_header, size):
+    #Parse "bytes=a-b,c-,-d" into sorted, merged inclusive (start, end) pairs
+    #Returns None when the header should be ignored and [] when nothing is satisfiable (416)
+    unit, _, range_set = range_header.partition('=')
+    if unit.strip().lower() != 'bytes' or not range_set:
+        return None
+
+    byte_ranges = []
+    specs = range_set.split(',')
+    if len(specs) > MAX_RANGES:
+        # Lots of tiny ranges are a known amplification trick, just send the whole file
+        return None
+
+    for spec in specs:
+        first, dash, last = spec.strip().partition('-')
+        if not dash:
+            return None
+        try:
+            if first == '':
+                # Suffix range - the last N bytes
+                suffix = int(last)
+                if suffix <= 0:
+                    continue
+                start, end = max(size - suffix, 0), size - 1
+            else:
+                start = int(first)
+                end = int(last) if last else size - 1
+                if last and end < start:
+                    return None
+                end = min(end, size - 1)
+        except ValueError:
+            return None
+        if start < 0:
+            return None
+        if start < size:
+            byte_ranges.append((start, end))
+
+    byte_ranges.sort()
+    merged = []
+    for start, end in byte_ranges:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+# Shed connections are drained for at most this long / this many bytes before they are closed
+SHED_DRAIN_SECONDS = 0.05
+SHED_DRAIN_BYTES = 64 * 1024
+
+
 class ConcurrentHTTPServer:
-    def __init__(self, host='0.0.0.0', port=8000, document_root='content', use_thread_pool=True, max_workers=10):
+    def __init__(self, host='0.0.0.0', port=8000, document_root='content', use_thread_pool=True, max_workers=10,
+                 use_asyncio=False, processes=1, cache_max_bytes=32 * 1024 * 1024, gzip_min_size=1024,
+                 state_dir=None, snapshot_interval=10.0, manifest_interval=2.0,
+                 keep_alive_timeout=5.0, max_keep_alive_requests=100, max_queue=100, max_queue_wait=10.0,
+                 max_pool_size=None, target_queue_wait=0.1, worker_idle_timeout=30.0,
+                 slow_request_threshold=1.5, slow_log_path=None, log_level='access', access_log_path=None,
+                 header_timeout=10.0, body_timeout=30.0, send_timeout=30.0,
+                 warmup_files=100, warmup_seconds=5.0, warmup_max_bytes=16 * 1024 * 1024):
         self.host = host
         self.port = port
         self.document_root = document_root
-        self.use_thread_pool = use_thread_pool
+        self.use_asyncio = use_asyncio
+        self.use_thread_pool = use_thread_pool and not use_asyncio
         self.max_workers = max_workers
+        self.processes = processes
+        self.worker_index = None  # set inside forked worker processes
 
         # Request counter - will demonstrate race condition
-        self.request_counter = {}
-        self.counter_lock = threading.Lock()
+        self.request_counter = ShardedCounter()
+        self.metrics = RequestMetrics(ShardedCounter())
 
-        # Rate limiting - per IP tracking
-        self.rate_limit_data = defaultdict(lambda: {'requests': [], 'blocked': 0})
-        self.rate_limit_lock = threading.Lock()
-        self.rate_limit = 5  # requests per second
+        self.total_requests = 0
+        self.shared_total_requests = None
+        self.stats_lock = threading.Lock()
 
-        # Thread pool
-        if use_thread_pool:
-            from concurrent.futures import ThreadPoolExecutor
-            self.thread_pool = ThreadPoolExecutor(max_workers=max_workers)
+        # URL path -> kind/stat/content type for everything under the document root
+        self.manifest = DocumentManifest(document_root, self.get_content_type, interval=manifest_interval)
 
-        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        # Multi-process mode - counters live in shared memory so every worker updates the same table
+        if processes > 1:
+            # Room for twice the files present at startup; hits beyond the table are counted as dropped
+            file_count = sum(1 for entry in self.manifest.entries.values() if entry.kind == 'file')
+            self.request_counter = SharedCounterTable(capacity=max(4096, 2 * file_count))
+            self.metrics = RequestMetrics(SharedCounterTable(capacity=1024, key_size=128))
+            self.shared_total_requests = multiprocessing.RawValue('q', 0)
+            self.stats_lock = multiprocessing.Lock()
 
-        self.total_requests = 0
-        self.stats_lock = threading.Lock()
+        # Rate limiting - per IP tracking
+        self.rate_limit = 5  # requests per second
+        # With --processes the block total is kept in shared memory so the parent can report and save it
+        shared_blocked = multiprocessing.Value('q', 0) if processes > 1 else None
+        self.rate_limiter = TokenBucketRateLimiter(rate=self.rate_limit, shared_blocked=shared_blocked)
+
+        # Counters survive restarts when a state directory is configured
+        self.snapshotter = StateSnapshotter(state_dir, snapshot_interval) if state_dir else None
+
+        # Hot small files are kept pre-encoded in memory (per process)
+        self.file_cache = FileCache(max_bytes=cache_max_bytes)
+        self.listing_cache = ListingCache()
+
+        # Before listening, the most requested files of the last run are loaded within these budgets (0 files = off)
+        self.warmup_files = warmup_files
+        self.warmup_seconds = warmup_seconds
+        self.warmup_max_bytes = warmup_max_bytes
+
+        self.negative_cache = NegativeCache()
+        # Concurrent cache misses for the same file or listing are read/rendered once
+        self.single_flight = SingleFlight()
+
+        # Per-request output goes through a background logger instead of print on the request thread
+        self.access_log = AccessLogger(log_level, access_log_path)
+
+        # Requests slower than this (seconds, including the simulated 1 s of work) are logged with their phases
+        self.slow_log = SlowRequestLog(slow_request_threshold, slow_log_path, self.access_log.notice)
+
+        # Dynamic bodies (listings, JSON, error pages) smaller than this are not worth compressing
+        self.gzip_min_size = gzip_min_size
+
+        # 404 is rendered (and gzipped) once - scanners probing thousands of missing paths get these bytes as they are
+        self.not_found_response = None
+        not_found_response = self.create_error_response(404, "Not Found").encode('utf-8')
+        self.not_found_response_gzip = self.compress_response(not_found_response)
+        self.not_found_response = not_found_response
+
+        # Keep-alive - idle connections wait in the monitor's selector, not in a worker thread
+        self.keep_alive_timeout = keep_alive_timeout
+        self.max_keep_alive_requests = max_keep_alive_requests
+
+        # Slow-client protection - a stalled client is dropped once a deadline passes instead of holding a worker
+        self.header_timeout = header_timeout  # whole request line + headers
+        self.body_timeout = body_timeout  # request body, once the headers are in
+        self.send_timeout = send_timeout  # longest a single send may make no progress
+        self.reaped_connections = ShardedCounter()
+
+        # New connections are parked here too until their first bytes arrive
+        self.idle_monitor = None
+        if not self.use_asyncio:
+            self.idle_monitor = IdleConnectionMonitor(self.resume_connection, keep_alive_timeout)
+
+        # Thread pool - connections wait in a bounded queue, overflow is answered with a pre-rendered 503
+        if self.use_thread_pool:
+            # max_workers is the floor, the pool grows up to max_pool_size while connections queue up
+            self.thread_pool = WorkerPool(max_workers, max_pool_size, max_queue=max_queue, max_queue_wait=max_queue_wait,
+                                          target_wait=target_queue_wait, idle_timeout=worker_idle_timeout)
+            self.overload_response = self.create_error_response(
+                503, "Service Unavailable", ["Retry-After: 1"]).encode('utf-8')
+
+        # Asyncio mode - connections are coroutines, only blocking filesystem work goes to a small executor
+        if self.use_asyncio:
+            from concurrent.futures import ThreadPoolExecutor
+            self.io_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='fs-io')
+
+        self.server_socket = self.create_server_socket()
+
+    def create_server_socket(self):
+        server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.processes > 1:
+            # Every worker binds its own listener on the same port, the kernel balances accepts between them
+            server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        return server_socket
+
+    def count_request(self):
+        #Increment the total request counter and return the new value (shared between workers if forked)
+        with self.stats_lock:
+            if self.shared_total_requests is not None:
+                self.shared_total_requests.value += 1
+                return self.shared_total_requests.value
+            self.total_requests += 1
+            return self.total_requests
+
+    def get_total_requests(self):
+        if self.shared_total_requests is not None:
+            return self.shared_total_requests.value
+        return self.total_requests
 
     def start_server(self):
+        if self.worker_index is None:
+            # docker stop sends SIGTERM - stop the same way as on Ctrl+C so the final snapshot is written
+            # (forked workers inherit the handler)
+            signal.signal(signal.SIGTERM, self.handle_sigterm)
+            self.restore_state()
+            # Forked workers inherit the warmed caches
+            self.warm_up()
+
+        if self.processes > 1 and self.worker_index is None:
+            self.start_worker_processes()
+            return
+
         try:
             self.server_socket.bind((self.host, self.port))
             self.server_socket.listen(100)
-            print(f" Concurrent Server started on http://{self.host}:{self.port}")
-            print(f" Serving files from: {os.path.abspath(self.document_root)}")
-            print(f" Mode: {'Thread Pool' if self.use_thread_pool else 'Thread per Request'}")
-            if self.use_thread_pool:
-                print(f" Thread Pool Size: {self.max_workers}")
-            print(f" Rate Limit: {self.rate_limit} requests/second per IP")
-            print("Press Ctrl+C to stop the server\n")
+            if self.worker_index is None:
+                self.print_banner()
+            else:
+                print(f" Worker {self.worker_index} (pid {os.getpid()}) listening on port {self.port}")
+
+            self.start_background_tasks()
+            if self.worker_index is None and self.snapshotter is not None:
+                self.snapshotter.start(self.collect_state)
+
+            if self.use_asyncio:
+                asyncio.run(self.serve_asyncio())
+                return
 
             while True:
                 client_socket, client_address = self.server_socket.accept()
 
-                with self.stats_lock:
-                    self.total_requests += 1
-
-                print(f" New connection from {client_address[0]}:{client_address[1]} (Total: {self.total_requests})")
+                self.access_log.debug("New connection from {}:{}", client_address[0], client_address[1])
 
-                if self.use_thread_pool:
-                    self.thread_pool.submit(self.handle_client, client_socket, client_address)
-                else:
-                    # Create new thread per request
-                    client_thread = threading.Thread(
-                        target=self.handle_client,
-                        args=(client_socket, client_address)
-                    )
-                    client_thread.daemon = True
-                    client_thread.start()
+                # Nothing is handed to a worker before the client has sent something
+                self.idle_monitor.park(client_socket, (client_address, None, 0), self.header_timeout, 'header')
 
         except KeyboardInterrupt:
-            print("\n Server stopping...")
-            self.print_statistics()
+            # Forked workers leave the summary to the parent, which sees the shared counters
+            if self.worker_index is None:
+                print("\n Server stopping...")
+                self.save_state()
+                self.print_statistics()
         except Exception as e:
             print(f" Server error: {e}")
         finally:
             if self.use_thread_pool:
-                self.thread_pool.shutdown(wait=True)
+                self.thread_pool.shutdown()
+            if self.use_asyncio:
+                self.io_executor.shutdown(wait=True)
+            self.access_log.stop()
             self.server_socket.close()
 
-    def handle_client(self, client_socket, client_address):
+    def handle_sigterm(self, signum, frame):
+        # A second SIGTERM while shutting down kills the process
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        raise KeyboardInterrupt
+
+    def collect_state(self):
+        #Everything that should survive a restart, as plain JSON data
+        rate_limit = self.rate_limiter.get_stats()
+        return {
+            'saved_at': time.time(),
+            'counters': {
+                'total_requests': self.get_total_requests(),
+                'request_counter': self.request_counter.snapshot(),
+                'rate_limit_blocked': rate_limit['blocked_total']
+            }
+        }
+
+    def restore_state(self):
+        if self.snapshotter is None:
+            return
+        state = self.snapshotter.load()
+        if not state:
+            return
+
+        counters = state.get('counters', {})
+        for filepath, count in counters.get('request_counter', {}).items():
+            self.request_counter[filepath] = count
+        with self.stats_lock:
+            if self.shared_total_requests is not None:
+                self.shared_total_requests.value = counters.get('total_requests', 0)
+            else:
+                self.total_requests = counters.get('total_requests', 0)
+        self.rate_limiter.restore_blocked(counters.get('rate_limit_blocked', 0))
+
+        print(f" Restored {len(counters.get('request_counter', {}))} hit counters from {self.snapshotter.path}")
+
+    def warm_up(self):
+        #Preload the most requested files of the last run, then the listings of the folders they are in
+        #Ranked by the restored hit counters, stops at whichever of the count, time and memory budgets runs out first
+        ranked = sorted(self.request_counter.snapshot().items(), key=lambda item: item[1], reverse=True)
+        if self.warmup_files <= 0 or not ranked:
+            return
+
+        started = time.perf_counter()
+        deadline = started + self.warmup_seconds
+        keys = {entry.fs_path: key for key, entry in self.manifest.entries.items() if entry.kind == 'file'}
+        loaded_bytes = 0
+        files = 0
+        folders = []
+
+        for filepath, _ in ranked[:self.warmup_files]:
+            if time.perf_counter() >= deadline or loaded_bytes >= self.warmup_max_bytes:
+                break
+            key = keys.get(filepath)
+            entry = self.manifest.lookup(key) if key is not None else None
+            # Files gone since the last run, or too big for the cache, are skipped
+            if entry is None or entry.size > self.file_cache.max_entry_size:
+                continue
+            if loaded_bytes + entry.size > self.warmup_max_bytes:
+                continue
+
+            content_type = entry.content_type
+            if content_type == 'text/html':
+                content_type = 'text/html; charset=utf-8'
+            try:
+                response = self.read_file_response(filepath, content_type)
+                if response is None:
+                    continue
+                loaded_bytes += len(response)
+                if is_compressible(content_type):
+                    loaded_bytes += len(self.compress_file(filepath, content_type))
+            except OSError as e:
+                print(f" Warm-up skipped '{filepath}': {e}")
+                continue
+            files += 1
+
+            folder = posixpath.dirname(key)
+            if folder and folder not in folders:
+                folders.append(folder)
+
+        listings = 0
+        for folder in folders:
+            if time.perf_counter() >= deadline or loaded_bytes >= self.warmup_max_bytes:
+                break
+            entry = self.manifest.lookup(folder)
+            if entry is None or entry.kind != 'dir':
+                continue
+            children = self.get_listing_order(folder, entry, 'name', 'asc')
+            if len(children) > LISTING_STREAM_THRESHOLD:
+                # Streamed listings are never cached
+                continue
+            # Same key as a request for /<folder>/, the form the listings link to
+            requested_path = f"{folder}/"
+            template = self.render_listing_template(entry, requested_path, children)
+            self.listing_cache.put((entry.fs_path, requested_path), entry.mtime_ns, template)
+            loaded_bytes += sum(len(chunk) for chunk in template[0])
+            listings += 1
+
+        print(f" Warm-up: {files} files and {listings} listings ({loaded_bytes / 1024 / 1024:.1f} MB) "
+              f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    def save_state(self):
+        if self.snapshotter is not None:
+            self.snapshotter.stop(self.collect_state)
+
+    def start_background_tasks(self):
+        #Housekeeping threads, started per serving process (after the fork in multi-process mode)
+        self.access_log.start()
+        self.rate_limiter.start_evictor()
+        self.manifest.start_watcher()
+        if self.use_thread_pool:
+            self.thread_pool.start()
+        if self.idle_monitor is not None:
+            self.idle_monitor.start()
+
+    def dispatch_connection(self, client_socket, client_address, parser=None, requests_served=0):
+        #Hand a connection that has (or is about to have) data to a worker
+        queued_at = time.perf_counter()
+        if self.use_thread_pool:
+            if not self.thread_pool.submit(self.handle_client, self.shed_connection,
+                                           client_socket, client_address, parser, requests_served, queued_at):
+                self.shed_connection(client_socket, client_address, parser, requests_served)
+        else:
+            # Create new thread per request
+            client_thread = threading.Thread(
+                target=self.handle_client,
+                args=(client_socket, client_address, parser, requests_served, queued_at)
+            )
+            client_thread.daemon = True
+            client_thread.start()
+
+    def shed_connection(self, client_socket, client_address, parser=None, requests_served=0, queued_at=None):
+        #Overloaded - send the pre-rendered 503 and drop the connection without touching the disk
+        self.access_log.notice("Queue full or wait exceeded, shedding {}:{}", client_address[0], client_address[1])
+        self.access_log.access(client_address[0], None, 503, len(self.overload_response))
+        self.metrics.observe('-', 503, 0.0, len(self.overload_response), in_flight=False)
         try:
-            client_ip = client_address[0]
+            # This runs on the accept/monitor thread, so neither the send nor the drain may block for long
+            client_socket.settimeout(0.05)
+            client_socket.sendall(self.overload_response)
+            # Half-close and drain whatever request bytes already arrived, otherwise close() resets the connection
+            client_socket.shutdown(socket.SHUT_WR)
+            # Bounded in time and bytes - a client that keeps sending must not hold the thread
+            deadline = time.monotonic() + SHED_DRAIN_SECONDS
+            drained = 0
+            while drained < SHED_DRAIN_BYTES and time.monotonic() < deadline:
+                data = client_socket.recv(16384)
+                if not data:
+                    break
+                drained += len(data)
+        except OSError:
+            pass
+        finally:
+            client_socket.close()
 
-            # Check rate limit
-            if not self.check_rate_limit(client_ip):
-                print(f" Rate limit exceeded for {client_ip}")
-                response = self.create_rate_limit_response()
-                client_socket.send(response.encode('utf-8'))
-                client_socket.close()
-                return
+    def resume_connection(self, client_socket, state):
+        #Called by the idle monitor when a parked keep-alive connection sends its next request
+        client_address, parser, requests_served = state
+        self.dispatch_connection(client_socket, client_address, parser, requests_served)
+
+    def print_banner(self):
+        print(f" Concurrent Server started on http://{self.host}:{self.port}")
+        print(f" Serving files from: {os.path.abspath(self.document_root)}")
+        print(f" Mode: {self.get_mode_name()}")
+        if self.use_thread_pool:
+            pool = self.thread_pool
+            size = f"{pool.min_workers}" if pool.max_workers == pool.min_workers else f"{pool.min_workers}-{pool.max_workers} (adaptive)"
+            print(f" Thread Pool Size: {size} (queue {pool.max_queue}, max wait {pool.max_queue_wait}s)")
+        if self.use_asyncio:
+            print(f" Filesystem Executor Size: {self.max_workers}")
+        if self.processes > 1:
+            print(f" Worker Processes: {self.processes} (SO_REUSEPORT)")
+        print(f" Rate Limit: {self.rate_limit} requests/second per IP")
+        print("Press Ctrl+C to stop the server\n")
+
+    def start_worker_processes(self):
+        #Fork the worker processes and wait for them, the parent itself never accepts connections
+        self.server_socket.close()
+        self.print_banner()
+
+        context = multiprocessing.get_context('fork')
+        workers = []
+        try:
+            for index in range(self.processes):
+                worker = context.Process(target=self.run_worker_process, args=(index,), name=f'http-worker-{index}')
+                worker.start()
+                workers.append(worker)
 
-            request_data = client_socket.recv(4096).decode('utf-8')
-            if not request_data:
-                #client_socket.close()
-                return
+            # Snapshots run in the parent, which sees the shared counters of every worker
+            if self.snapshotter is not None:
+                self.snapshotter.start(self.collect_state)
 
-            print(f" [{threading.current_thread().name}] Processing request from {client_ip}")
+            for worker in workers:
+                worker.join()
 
-            time.sleep(1)
+        except KeyboardInterrupt:
+            print("\n Server stopping...")
+            for worker in workers:
+                # Ctrl+C in a terminal reaches the whole process group, a plain kill or docker stop only reaches us
+                if worker.is_alive():
+                    os.kill(worker.pid, signal.SIGINT)
+            for worker in workers:
+                worker.join(timeout=5)
+            self.save_state()
+            self.print_statistics()
+        finally:
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+
+    def run_worker_process(self, worker_index):
+        self.worker_index = worker_index
+        self.server_socket = self.create_server_socket()
+        self.start_server()
+
+    def get_mode_name(self):
+        if self.use_asyncio:
+            return 'Asyncio'
+        return 'Thread Pool' if self.use_thread_pool else 'Thread per Request'
+
+    async def serve_asyncio(self):
+        #Accept connections on the already bound socket with asyncio.start_server
+        self.server_socket.setblocking(False)
+        server = await asyncio.start_server(self.handle_client_async, sock=self.server_socket, backlog=100)
+        async with server:
+            await server.serve_forever()
+
+    def handle_client(self, client_socket, client_address, parser=None, requests_served=0, queued_at=None):
+        parked = False
+        try:
+            client_ip = client_address[0]
+            if parser is None:
+                parser = HTTPRequestParser()
 
-            requested_path = self.parse_request(request_data)
-            if requested_path == '/stats':
-                self.handle_stats_request(client_socket)
+            # Phases: queue (waiting for a worker), recv, rate, delay (simulated work), fs (build_response), send
+            timer = PhaseTimer(queued_at)
+            timer.lap('queue')
+            try:
+                requests = self.receive_requests(client_socket, parser)
+            except HTTPParseError as e:
+                started = time.perf_counter()
+                sent = self.send_response(client_socket, self.create_error_response(e.status_code, e.status_message))
+                self.metrics.observe('-', e.status_code, time.perf_counter() - started, sent, in_flight=False)
+                self.access_log.access(client_ip, None, e.status_code, sent)
+                return
+            except ConnectionDeadlineExceeded as e:
+                self.reap_connection(client_socket, client_ip, e.phase, parser)
+                return
+            if not requests:
+                #client_socket.close()
                 return
-            if requested_path is None:
-                response = self.create_error_response(400, "Bad Request")
-                client_socket.send(response.encode('utf-8'))
-            else:
-                response = self.serve_file(requested_path)
-                if isinstance(response, bytes):
-                    client_socket.send(response)
-                else:
-                    client_socket.send(response.encode('utf-8'))
 
+            # Pipelined requests are answered in order on this worker
+            timer.lap('recv')
+            for request in requests:
+                started = time.perf_counter()
+                route = self.get_route_label(request.path)
+
+                # Check rate limit
+                allowed = self.check_rate_limit(client_ip)
+                timer.lap('rate')
+                if not allowed:
+                    self.access_log.notice("Rate limit exceeded for {}", client_ip)
+                    response = self.create_rate_limit_response()
+                    sent = self.send_response(client_socket, response)
+                    self.metrics.observe(route, 429, time.perf_counter() - started, sent, in_flight=False)
+                    self.access_log.access(client_ip, request, 429, sent)
+                    return
+
+                total = self.count_request()
+                self.access_log.debug("[{}] Processing request from {} (Total: {})",
+                                      threading.current_thread().name, client_ip, total)
+                self.metrics.request_started()
+
+                time.sleep(1)
+                timer.lap('delay')
+
+                requests_served += 1
+                keep_alive = self.should_keep_alive(request, requests_served)
+                status = 500
+                sent = 0
+                try:
+                    response = self.build_response(request)
+                    timer.lap('fs')
+                    if isinstance(response, StreamResponse) and not response.chunked:
+                        # HTTP/1.0 stream - the end of the body is marked by closing the connection
+                        keep_alive = False
+                    status = self.get_response_status(response)
+                    sent = self.send_response(client_socket, response, keep_alive, requests_served, timer)
+                    timer.lap('send')
+                finally:
+                    self.metrics.observe(route, status, time.perf_counter() - started, sent)
+                    self.access_log.access(client_ip, request, status, sent)
+                self.slow_log.record(timer, client_ip, request, status)
+                if not keep_alive:
+                    return
+                # Pipelined requests after the first start with no queue or recv time of their own
+                timer = PhaseTimer()
+
+            # Idle between requests - park the socket in the monitor and free this worker
+            self.idle_monitor.park(client_socket, (client_address, parser, requests_served))
+            parked = True
+
+        except ConnectionDeadlineExceeded as e:
+            self.reap_connection(client_socket, client_address[0], e.phase)
         except Exception as e:
             print(f" Error handling client: {e}")
             error_response = self.create_error_response(500, "Internal Server Error")
             try:
-                client_socket.send(error_response.encode('utf-8'))
+                client_socket.sendall(error_response.encode('utf-8'))
             except:
                 pass
         finally:
-            client_socket.close()
+            if not parked:
+                client_socket.close()
 
+    def should_keep_alive(self, request, requests_served):
+        #HTTP/1.1 keeps the connection by default, HTTP/1.0 only on request, both capped per connection
+        if self.keep_alive_timeout <= 0 or requests_served >= self.max_keep_alive_requests:
+            return False
+        connection = (request.get_header('Connection') or '').lower()
+        if request.version == 'HTTP/1.1':
+            return 'close' not in connection
+        return 'keep-alive' in connection
+
+    def get_route_label(self, path):
+        #Low-cardinality route name for metrics - never the raw path
+        if path in ('stats', 'stats.json', 'metrics', 'files', 'files.json'):
+            return '/stats' if path == 'stats.json' else '/' + path
+        if path.startswith('files/'):
+            return '/files/*'
+        return 'static'
+
+    def get_response_status(self, response):
+        #Status code from the status line of a built response
+        head = response.headers if isinstance(response, (FileResponse, StreamResponse)) else response
+        return int(head[9:12])
+
+    async def handle_client_async(self, reader, writer):
+        #Asyncio counterpart of handle_client - an idle or slow client only costs a coroutine
+        client_address = writer.get_extra_info('peername')
+        client_ip = client_address[0]
+
+        self.access_log.debug("New connection from {}:{}", client_ip, client_address[1])
+
+        parser = HTTPRequestParser()
+        requests_served = 0
+        try:
+            while True:
+                requests = []
+                timer = None
+                phase = None
+                try:
+                    while not requests:
+                        if requests_served and timer is None and not parser.has_partial_request():
+                            # Idle keep-alive connection, give up after the idle timeout
+                            phase = 'idle'
+                            timeout = self.keep_alive_timeout
+                        else:
+                            current = 'body' if parser.body_remaining else 'header'
+                            if current != phase:
+                                phase = current
+                                deadline = time.monotonic() + (self.body_timeout if phase == 'body' else self.header_timeout)
+                            timeout = max(deadline - time.monotonic(), 0)
+                        data = await asyncio.wait_for(reader.read(16384), timeout)
+                        if not data:
+                            break
+                        if timer is None:
+                            # recv is measured from the first byte, the wait before it is client idle time
+                            timer = PhaseTimer()
+                        requests = parser.feed(data)
+                except asyncio.TimeoutError:
+                    if phase != 'idle':
+                        await self.reap_connection_async(writer, client_ip, phase, parser)
+                    return
+                except HTTPParseError as e:
+                    started = time.perf_counter()
+                    sent = await self.send_response_async(writer, self.create_error_response(e.status_code, e.status_message))
+                    self.metrics.observe('-', e.status_code, time.perf_counter() - started, sent, in_flight=False)
+                    self.access_log.access(client_ip, None, e.status_code, sent)
+                    return
+                if not requests:
+                    return
+
+                timer.lap('recv')
+                for request in requests:
+                    started = time.perf_counter()
+                    route = self.get_route_label(request.path)
+
+                    # Check rate limit
+                    allowed = self.check_rate_limit(client_ip)
+                    timer.lap('rate')
+                    if not allowed:
+                        self.access_log.notice("Rate limit exceeded for {}", client_ip)
+                        sent = await self.send_response_async(writer, self.create_rate_limit_response())
+                        self.metrics.observe(route, 429, time.perf_counter() - started, sent, in_flight=False)
+                        self.access_log.access(client_ip, request, 429, sent)
+                        return
+
+                    total = self.count_request()
+                    self.access_log.debug("[asyncio] Processing request from {} (Total: {})", client_ip, total)
+                    self.metrics.request_started()
+
+                    await asyncio.sleep(1)
+                    timer.lap('delay')
+
+                    requests_served += 1
+                    keep_alive = self.should_keep_alive(request, requests_served)
+                    status = 500
+                    sent = 0
+                    try:
+                        loop = asyncio.get_running_loop()
+                        response = await loop.run_in_executor(self.io_executor, self.build_response, request)
+                        timer.lap('fs')
+                        if isinstance(response, StreamResponse) and not response.chunked:
+                            keep_alive = False
+                        status = self.get_response_status(response)
+                        try:
+                            sent = await self.send_response_async(writer, response, keep_alive, requests_served, timer)
+                        except asyncio.TimeoutError:
+                            raise ConnectionDeadlineExceeded('send')
+                        timer.lap('send')
+                    finally:
+                        self.metrics.observe(route, status, time.perf_counter() - started, sent)
+                        self.access_log.access(client_ip, request, status, sent)
+                    self.slow_log.record(timer, client_ip, request, status)
+                    if not keep_alive:
+                        return
+                    timer = PhaseTimer()
+
+        except ConnectionDeadlineExceeded as e:
+            await self.reap_connection_async(writer, client_ip, e.phase)
+        except Exception as e:
+            print(f" Error handling client: {e}")
+            try:
+                writer.write(self.create_error_response(500, "Internal Server Error").encode('utf-8'))
+                await writer.drain()
+            except:
+                pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except:
+                pass
 
+    def receive_requests(self, client_socket, parser):
+        #recv_into the worker's reusable buffer until at least one full request is parsed (or EOF)
+        #Raises ConnectionDeadlineExceeded when the headers or the body take longer than their deadline
+        view = get_recv_buffer()
+        phase = None
+        while True:
+            current = 'body' if parser.body_remaining else 'header'
+            if current != phase:
+                phase = current
+                deadline = time.monotonic() + (self.body_timeout if phase == 'body' else self.header_timeout)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise ConnectionDeadlineExceeded(phase)
+            client_socket.settimeout(remaining)
+            try:
+                received = client_socket.recv_into(view)
+            except socket.timeout:
+                raise ConnectionDeadlineExceeded(phase)
+            if not received:
+                return []
+            requests = parser.feed(view[:received])
+            if requests:
+                return requests
+
+    def reap_connection(self, client_socket, client_ip, phase, parser=None):
+        #Count a stalled connection; a client stuck mid-request still gets a 408 on the way out
+        self.reaped_connections.increment(phase)
+        self.access_log.notice("Dropping stalled connection from {} ({} deadline)", client_ip, phase)
+        if phase == 'send' or parser is None or not parser.has_partial_request():
+            return
+        try:
+            client_socket.settimeout(1.0)
+            client_socket.sendall(self.create_error_response(408, "Request Timeout").encode('utf-8'))
+        except OSError:
+            pass
+
+    def split_response(self, response):
+        #Split an in-memory response into its header block and a zero-copy view of the body
+        if isinstance(response, str):
+            response = response.encode('utf-8')
+        head_end = response.find(b'\r\n\r\n') + 4
+        return response[:head_end], memoryview(response)[head_end:]
+
+    def finalize_headers(self, head, keep_alive, requests_served, timer=None):
+        #Builders always write "Connection: close" - swap it when the connection stays open
+        #and add the Server-Timing header for the phases measured so far
+        if not keep_alive and timer is None:
+            return head
+        headers = ''
+        if timer is not None:
+            headers += f"Server-Timing: {timer.header_value()}\r\n"
+        if keep_alive:
+            remaining = self.max_keep_alive_requests - requests_served
+            headers += (
+                f"Connection: keep-alive\r\n"
+                f"Keep-Alive: timeout={int(self.keep_alive_timeout)}, max={remaining}\r\n"
+            )
+        else:
+            headers += "Connection: close\r\n"
+        return head.replace(b"Connection: close\r\n", headers.encode('utf-8'), 1)
+
+    def send_response(self, client_socket, response, keep_alive=False, requests_served=0, timer=None):
+        #Send a response built by build_response, file bodies go through socket.sendfile (zero-copy)
+        #Returns the number of bytes sent, raises ConnectionDeadlineExceeded if the client stops reading
+        client_socket.settimeout(self.send_timeout)
+        try:
+            return self.send_response_parts(client_socket, response, keep_alive, requests_served, timer)
+        except socket.timeout:
+            raise ConnectionDeadlineExceeded('send')
 
-    def check_rate_limit(self, client_ip):
-        #Check if client IP has exceeded rate limit (thread-safe)
-        with self.rate_limit_lock:
-            current_time = time.time()
-            client_data = self.rate_limit_data[client_ip]
-
-            # Remove requests older than 1 second
-            client_data['requests'] = [
-                req_time for req_time in client_data['requests']
-                if current_time - req_time < 1.0
-            ]
+    def send_response_parts(self, client_socket, response, keep_alive, requests_served, timer):
+        if isinstance(response, StreamResponse):
+            try:
+                head = self.finalize_headers(response.headers, keep_alive, requests_served, timer)
+                client_socket.sendall(head)
+                sent = len(head)
+                for piece in response.iter_body():
+                    client_socket.sendall(piece)
+                    sent += len(piece)
+            finally:
+                response.close()
+            return sent
+
+        if isinstance(response, FileResponse):
+            try:
+                head = self.finalize_headers(response.headers, keep_alive, requests_served, timer)
+                client_socket.sendall(head)
+                sent = len(head)
+                for part in response.iter_parts():
+                    if isinstance(part, bytes):
+                        client_socket.sendall(part)
+                        sent += len(part)
+                    else:
+                        sent += client_socket.sendfile(response.file, part[0], part[1])
+            finally:
+                response.close()
+            return sent
+
+        head, body = self.split_response(response)
+        head = self.finalize_headers(head, keep_alive, requests_served, timer)
+        if len(body) < 65536:
+            client_socket.sendall(head + body)
+        else:
+            # Large cached bodies are not copied just to prepend the headers
+            client_socket.sendall(head)
+            client_socket.sendall(body)
+        return len(head) + len(body)
+
+    async def send_response_async(self, writer, response, keep_alive=False, requests_served=0, timer=None):
+        #Every wait for the client to read is bounded by send_timeout (asyncio.TimeoutError)
+        if isinstance(response, StreamResponse):
+            try:
+                head = self.finalize_headers(response.headers, keep_alive, requests_served, timer)
+                writer.write(head)
+                sent = len(head)
+                loop = asyncio.get_running_loop()
+                pieces = response.iter_body()
+                while True:
+                    # Rendering happens in the executor so a huge listing does not stall the event loop
+                    piece = await loop.run_in_executor(self.io_executor, next, pieces, None)
+                    if piece is None:
+                        break
+                    writer.write(piece)
+                    sent += len(piece)
+                    await asyncio.wait_for(writer.drain(), self.send_timeout)
+            finally:
+                response.close()
+            return sent
+
+        if isinstance(response, FileResponse):
+            try:
+                head = self.finalize_headers(response.headers, keep_alive, requests_served, timer)
+                writer.write(head)
+                sent = len(head)
+                loop = asyncio.get_running_loop()
+                for part in response.iter_parts():
+                    if isinstance(part, bytes):
+                        writer.write(part)
+                        sent += len(part)
+                    else:
+                        await asyncio.wait_for(writer.drain(), self.send_timeout)
+                        sent += await asyncio.wait_for(
+                            loop.sendfile(writer.transport, response.file, part[0], part[1]), self.send_timeout)
+            finally:
+                response.close()
+        else:
+            head, body = self.split_response(response)
+            head = self.finalize_headers(head, keep_alive, requests_served, timer)
+            writer.write(head)
+            writer.write(body)
+            sent = len(head) + len(body)
+        await asyncio.wait_for(writer.drain(), self.send_timeout)
+        return sent
+
+    async def reap_connection_async(self, writer, client_ip, phase, parser=None):
+        self.reaped_connections.increment(phase)
+        self.access_log.notice("Dropping stalled connection from {} ({} deadline)", client_ip, phase)
+        if phase == 'send' or parser is None or not parser.has_partial_request():
+            return
+        try:
+            writer.write(self.create_error_response(408, "Request Timeout").encode('utf-8'))
+            await asyncio.wait_for(writer.drain(), 1.0)
+        except (OSError, asyncio.TimeoutError):
+            pass
+
+    def build_response(self, request):
+        #Turn a parsed request (or raw request data) into a response, shared by every serving mode
+        if not isinstance(request, HTTPRequest):
+            request = self.parse_request(request)
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return self.create_error_response(400, "Bad Request")
+        response = self.serve_file(request.path, request)
+        if accepts_gzip(request):
+            response = self.compress_response(response)
+        if request.method == 'HEAD':
+            return self.strip_body(response)
+        return response
 
-            # Check if under rate limit
-            if len(client_data['requests']) >= self.rate_limit:
-                client_data['blocked'] += 1
-                return False
+    def compress_response(self, response):
+        #Gzip a dynamic in-memory response on the fly (static files are compressed once in serve_single_file)
+        if isinstance(response, FileResponse):
+            return response
+        if isinstance(response, StreamResponse):
+            # Streamed listings are compressed chunk by chunk as they are sent
+            response.chunks = gzip_stream(response.chunks, GZIP_LEVEL_DYNAMIC)
+            response.headers = response.headers.replace(
+                b'\r\n\r\n', b'\r\nContent-Encoding: gzip\r\nVary: Accept-Encoding\r\n\r\n', 1)
+            return response
+        if response is self.not_found_response:
+            return self.not_found_response_gzip
+        if isinstance(response, str):
+            response = response.encode('utf-8')
+
+        head_end = response.find(b'\r\n\r\n')
+        body = response[head_end + 4:]
+        if len(body) < self.gzip_min_size:
+            return response
+
+        lines = response[:head_end].decode('latin-1').split('\r\n')
+        content_type = ''
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            name = name.strip().lower()
+            if name == 'content-encoding':
+                return response
+            if name == 'content-type':
+                content_type = value.strip()
+        status = lines[0].split(' ')
+        if len(status) < 2 or status[1] in ('206', '304') or not is_compressible(content_type):
+            return response
+
+        compressed = gzip.compress(body, compresslevel=GZIP_LEVEL_DYNAMIC)
+        headers = [lines[0]]
+        for line in lines[1:]:
+            if line.lower().startswith('content-length:'):
+                line = f"Content-Length: {len(compressed)}"
+            headers.append(line)
+        headers.append("Content-Encoding: gzip")
+        headers.append("Vary: Accept-Encoding")
+        return ('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1') + compressed
+
+    def strip_body(self, response):
+        #HEAD - keep status line and headers (Content-Length still describes the GET body)
+        if isinstance(response, (FileResponse, StreamResponse)):
+            response.close()
+            return response.headers
+        if isinstance(response, str):
+            response = response.encode('utf-8')
+        return response[:response.find(b'\r\n\r\n') + 4]
 
-            # Add current request
-            client_data['requests'].append(current_time)
-            return True
+    def check_rate_limit(self, client_ip):
+        #Check if client IP has exceeded rate limit (thread-safe, constant time)
+        return self.rate_limiter.allow(client_ip)
 
     def increment_file_counter_naive(self, filepath):
         #NAIVE implementation - NO LOCK - will cause race condition
@@ -165,62 +2354,59 @@ class ConcurrentHTTPServer:
               f"Read {current}, Writing {current + 1} for {os.path.basename(filepath)}")
 
     def increment_file_counter_safe(self, filepath):
-        #THREAD-SAFE implementation using lock
-        with self.counter_lock:
-            current = self.request_counter.get(filepath, 0)
-            time.sleep(0.01)
-            new_value = current + 1
-            self.request_counter[filepath] = new_value
-
-            print(f"   [SAFE] Thread {threading.current_thread().name}: "
-                  f"Read {current}, Writing {new_value} for {os.path.basename(filepath)}")
+        #THREAD-SAFE implementation - each thread increments its own shard, no shared lock
+        self.request_counter.increment(filepath)
 
     def parse_request(self, request_data):
-        #Parse an HTTP request and extract the GET request
+        #Parse a complete request given as str/bytes - the serving loops feed HTTPRequestParser directly
         try:
-            lines = request_data.split('\n')
-            if not lines:
+            if isinstance(request_data, str):
+                request_data = request_data.encode('utf-8')
+            parser = HTTPRequestParser()
+            # A request without the terminating blank line is still parsed as far as it goes
+            requests = parser.feed(request_data) or parser.feed(b'\r\n\r\n')
+            if not requests or requests[0].method not in ('GET', 'HEAD'):
                 return None
-
-            request_line = lines[0].strip()
-            parts = request_line.split(' ')
-
-            if len(parts) < 2:
-                return None
-
-            method = parts[0]
-            path = parts[1]
-
-            if method != 'GET':
-                return None
-            path = unquote(path)
-            if path.startswith('/'):
-                path = path[1:]
-            if not path:
-                path = 'index.html'
-            return path
+            return requests[0]
 
         except Exception as e:
             print(f" Error parsing request: {e}")
             return None
 
-    def serve_file(self, requested_path):
+    def serve_file(self, requested_path, request=None):
         #Serve requested file or directory listing
         if requested_path == 'stats' or requested_path == 'stats.json':
             return self.serve_stats_json()
 
-        if requested_path == 'files' or requested_path == 'files.json':
+        if requested_path == 'files':
             return self.serve_files_list_json()
 
-        filepath = os.path.join(self.document_root, requested_path)
-        abs_document_root = os.path.abspath(self.document_root)
-        abs_filepath = os.path.abspath(filepath)
+        if requested_path == 'files.json':
+            return self.serve_files_index_json(request)
 
-        if not abs_filepath.startswith(abs_document_root):
+        if requested_path == 'metrics':
+            return self.serve_metrics()
+
+        # Repeated misses are answered before any path work; read the generation before the lookup so a
+        # miss is never remembered against a newer manifest than the one it was looked up in
+        generation = self.manifest.generation
+        if self.negative_cache.contains(requested_path, generation):
+            return self.not_found_response
+
+        # Traversal check and routing are both answered from the in-memory manifest
+        manifest_key = self.manifest.resolve(requested_path)
+        if manifest_key is None:
             return self.create_error_response(403, "Forbidden")
 
         try:
-            if os.path.isfile(filepath):
+            entry = self.manifest.lookup(manifest_key)
+            if entry is None:
+                self.negative_cache.add(requested_path, generation)
+                return self.not_found_response
+
+            if entry.kind == 'file':
+                filepath = entry.fs_path
+
                 # naive implementation to get race condition
                 # self.increment_file_counter_naive(filepath)
 
@@ -228,11 +2414,9 @@ class ConcurrentHTTPServer:
                 self.increment_file_counter_safe(filepath)
 
 
-                return self.serve_single_file(filepath)
-            elif os.path.isdir(filepath):
-                return self.serve_directory_listing(filepath, requested_path)
+                return self.serve_single_file(filepath, request, entry.content_type)
             else:
-                return self.create_error_response(404, "Not Found")
+                return self.serve_directory_listing(entry, requested_path, manifest_key, request)
 
         except Exception as e:
             print(f" Error serving file '{requested_path}': {e}")
@@ -241,14 +2425,27 @@ class ConcurrentHTTPServer:
     def serve_stats_json(self):
         try:
             stats = {}
-            with self.counter_lock:
-                for filepath, count in self.request_counter.items():
-                    # Extract just the filename from the full path
-                    filename = os.path.basename(filepath)
-                    stats[filename] = count
+            for filepath, count in self.request_counter.snapshot().items():
+                # Extract just the filename from the full path
+                filename = os.path.basename(filepath)
+                stats[filename] = count
+
+            # Server internals go under one reserved key so the flat filename -> hits layout stays intact
+            stats['_server'] = {
+                'hit_counters': self.request_counter.get_stats(),
+                'cache': self.file_cache.get_stats(),
+                'listing_cache': self.listing_cache.get_stats(),
+                'manifest': self.manifest.get_stats(),
+                'negative_cache': self.negative_cache.get_stats(),
+                'single_flight': self.single_flight.get_stats(),
+                'queue': self.thread_pool.get_stats() if self.use_thread_pool else {},
+                'keep_alive': self.idle_monitor.get_stats() if self.idle_monitor else {},
+                'access_log': self.access_log.get_stats(),
+                'deadlines': self.get_deadline_stats(),
+                'rate_limit': self.rate_limiter.get_stats()
+            }
 
-            import json
-            json_data = json.dumps(stats)
+            json_data = json.dumps(stats).encode('utf-8')
 
             response = (
                 f"HTTP/1.1 200 OK\r\n"
@@ -257,18 +2454,92 @@ class ConcurrentHTTPServer:
                 f"Access-Control-Allow-Origin: *\r\n"
                 f"Connection: close\r\n"
                 f"\r\n"
-                f"{json_data}"
             )
 
-            return response.encode('utf-8')
+            return response.encode('utf-8') + json_data
 
         except Exception as e:
             print(f" Error creating stats JSON: {e}")
             return self.create_error_response(500, "Internal Server Error")
 
+    def serve_metrics(self):
+        #Prometheus text format - request counters and latency histograms plus point-in-time server gauges
+        try:
+            cache = self.file_cache.get_stats()
+            listing_cache = self.listing_cache.get_stats()
+            rate_limit = self.rate_limiter.get_stats()
+            negative_cache = self.negative_cache.get_stats()
+            single_flight = self.single_flight.get_stats()
+            gauges = [
+                ('http_requests_processed_total', 'Requests accepted by the server (all workers).', 'counter', self.get_total_requests()),
+                ('rate_limit_rejections_total', 'Requests answered with 429 by this process.', 'counter', rate_limit['blocked_total']),
+                ('rate_limit_tracked_clients', 'Client IPs with a live token bucket.', 'gauge', rate_limit['tracked_ips']),
+                ('file_cache_hits_total', 'File cache hits.', 'counter', cache['hits']),
+                ('file_cache_misses_total', 'File cache misses.', 'counter', cache['misses']),
+                ('file_cache_evictions_total', 'File cache evictions.', 'counter', cache['evictions']),
+                ('file_cache_bytes', 'Bytes held by the file cache.', 'gauge', cache['bytes']),
+                ('file_cache_entries', 'Entries in the file cache.', 'gauge', cache['entries']),
+                ('listing_cache_hits_total', 'Directory listing cache hits.', 'counter', listing_cache['hits']),
+                ('listing_cache_misses_total', 'Directory listing cache misses.', 'counter', listing_cache['misses']),
+                ('manifest_entries', 'Paths in the document root manifest.', 'gauge', self.manifest.get_stats()['entries']),
+                ('negative_cache_hits_total', 'Requests for missing paths answered from the negative cache.', 'counter', negative_cache['hits']),
+                ('negative_cache_entries', 'Missing paths remembered by the negative cache.', 'gauge', negative_cache['entries']),
+                ('single_flight_leaders_total', 'File reads and listing renders actually performed on a cache miss.', 'counter', single_flight['leaders']),
+                ('single_flight_coalesced_total', 'Cache misses that waited for a concurrent read or render instead.', 'counter', single_flight['coalesced'])
+            ]
+            if self.use_thread_pool:
+                pool = self.thread_pool.get_stats()
+                gauges += [
+                    ('pool_workers', 'Worker threads in the pool.', 'gauge', pool['workers']),
+                    ('pool_busy_workers', 'Workers currently running a connection.', 'gauge', pool['busy']),
+                    ('pool_queue_depth', 'Connections waiting for a worker.', 'gauge', pool['queue_depth']),
+                    ('pool_queue_wait_max_seconds', 'Longest time a connection waited in the queue.', 'gauge', pool['max_wait_ms'] / 1000),
+                    ('pool_rejected_total', 'Connections shed because the queue was full.', 'counter', pool['rejected_full']),
+                    ('pool_expired_total', 'Connections shed after waiting longer than the queue deadline.', 'counter', pool['shed_expired'])
+                ]
+            reaped = self.get_deadline_stats()['reaped']
+            gauges += [
+                (f'connections_reaped_{phase}_total', f'Connections dropped after the {phase} deadline.', 'counter', count)
+                for phase, count in reaped.items()
+            ]
+            if self.idle_monitor is not None:
+                keep_alive = self.idle_monitor.get_stats()
+                gauges += [
+                    ('keep_alive_idle_connections', 'Idle keep-alive connections parked in the monitor.', 'gauge', keep_alive['idle_connections']),
+                    ('keep_alive_timeouts_total', 'Keep-alive connections closed after the idle timeout.', 'counter', keep_alive['idle_timeouts'])
+                ]
+
+            body = self.metrics.render(gauges).encode('utf-8')
+
+            response = (
+                f"HTTP/1.1 200 OK\r\n"
+                f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: close\r\n"
+                f"\r\n"
+            )
+
+            return response.encode('utf-8') + body
+
+        except Exception as e:
+            print(f" Error creating metrics: {e}")
+            return self.create_error_response(500, "Internal Server Error")
+
+    def get_deadline_stats(self):
+        #Connections dropped per deadline - header timeouts of never-readable new connections are counted by the monitor
+        reaped = {phase: self.reaped_connections.get(phase) for phase in ('header', 'body', 'send')}
+        if self.idle_monitor is not None:
+            reaped['header'] += self.idle_monitor.get_stats()['header_timeouts']
+        return {
+            'header_timeout_s': self.header_timeout,
+            'body_timeout_s': self.body_timeout,
+            'send_timeout_s': self.send_timeout,
+            'reaped': reaped
+        }
+
     def serve_files_list_json(self):
+        #Top level of the document root grouped for the home page, read from the manifest (no listdir)
         try:
-            import json
 
             files_data = {
                 'images': [],
@@ -276,23 +2547,17 @@ class ConcurrentHTTPServer:
                 'directories': []
             }
 
-            items = os.listdir(self.document_root)
-            items.sort()
-
-            for item in items:
+            root = self.manifest.lookup('')
+            for item, kind in root.children:
                 if item.startswith('.') or item == 'index.html':
                     continue
 
-                item_path = os.path.join(self.document_root, item)
-
-                if os.path.isdir(item_path):
+                if kind == 'dir':
                     files_data['directories'].append(item)
-                elif os.path.isfile(item_path):
-                    ext = os.path.splitext(item)[1].lower()
-                    if ext in ['.png', '.jpg', '.jpeg', '.gif']:
-                        files_data['images'].append(item)
-                    elif ext in ['.pdf', '.doc', '.docx', '.docs', '.txt', '.html']:
-                        files_data['documents'].append(item)
+                else:
+                    file_kind = get_file_kind(item)
+                    if file_kind != 'other':
+                        files_data[file_kind + 's'].append(item)
 
             json_data = json.dumps(files_data)
 
@@ -312,31 +2577,337 @@ class ConcurrentHTTPServer:
             print(f" Error creating files list JSON: {e}")
             return self.create_error_response(500, "Internal Server Error")
 
-    def serve_single_file(self, filepath):
+    def serve_files_index_json(self, request=None):
+        #Recursive file index from the manifest change feed, paged with an opaque cursor
+        #?since=<token> returns only what changed (deletions included) after the token of an earlier response
         try:
-            content_type = self.get_content_type(filepath)
-            if content_type == 'text/html':
-                content_type = 'text/html; charset=utf-8'
+            params = parse_qs(request.query if request else '')
 
-            with open(filepath, 'rb') as f:
-                content = f.read()
+            def single(name, default):
+                values = params.get(name)
+                return values[-1] if values else default
 
-            content_length = len(content)
+            # Tokens are "<epoch>.<generation>" and cursors "<epoch>.<seq>:<path>"; '0' as since means everything
+            manifest = self.manifest
+            epoch = manifest.epoch
+            stale = False
+            try:
+                limit = int(single('limit', 100))
+                since_epoch, _, since = single('since', '0').rpartition('.')
+                since = int(since)
+                if since_epoch != epoch and since != 0:
+                    stale = True
+                cursor = single('cursor', None)
+                if cursor is not None:
+                    cursor_position, _, cursor_key = cursor.partition(':')
+                    cursor_epoch, _, cursor_seq = cursor_position.rpartition('.')
+                    cursor = (int(cursor_seq), cursor_key, True)
+                    if cursor_epoch != epoch:
+                        stale = True
+            except ValueError:
+                return self.create_error_response(400, "Bad Request")
+            file_type = single('type', None)
+            if not 0 < limit <= 1000 or since < 0 or (file_type is not None and file_type not in FILE_TYPE_FILTERS):
+                return self.create_error_response(400, "Bad Request")
+
+            # Take one consistent view of the feed, the watcher swaps in a new list on every change
+            # (token first: a feed newer than the token only means a few items are sent twice)
+            generation = manifest.generation
+            feed = manifest.change_feed
+            entries = manifest.entries
+
+            # A token or cursor from another server run or worker, or from the future, cannot be resumed
+            stale = stale or since > generation or (cursor is not None and cursor[0] > generation)
+            files_data = {
+                'token': f"{epoch}.{generation}",
+                # Deletions older than the tombstone floor are forgotten - the client has to start over
+                'reset': stale or 0 < since < manifest.tombstone_floor,
+                'items': [],
+                'next_cursor': None
+            }
 
-            response_headers = (
+            # (since + 1,) sorts before every feed item stamped after the token
+            if stale:
+                start = len(feed)
+            elif cursor is not None:
+                start = bisect.bisect_right(feed, cursor)
+            else:
+                start = bisect.bisect_left(feed, (since + 1,))
+            items = files_data['items']
+            for seq, key, deleted in feed[start:]:
+                if deleted and since == 0:
+                    # A full listing has nothing to delete
+                    continue
+                if file_type is not None and get_file_kind(key) != FILE_TYPE_FILTERS[file_type]:
+                    continue
+                if deleted:
+                    items.append({'path': key, 'seq': seq, 'deleted': True})
+                else:
+                    entry = entries.get(key)
+                    if entry is None:
+                        continue
+                    items.append({
+                        'path': key,
+                        'seq': seq,
+                        'type': get_file_kind(key),
+                        'content_type': entry.content_type,
+                        'size': entry.size,
+                        'mtime': entry.mtime_ns // 1000000000
+                    })
+                if len(items) == limit:
+                    files_data['next_cursor'] = f"{epoch}.{seq}:{key}"
+                    break
+
+            json_data = json.dumps(files_data).encode('utf-8')
+
+            response = (
                 f"HTTP/1.1 200 OK\r\n"
-                f"Content-Type: {content_type}\r\n"
-                f"Content-Length: {content_length}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(json_data)}\r\n"
+                f"Access-Control-Allow-Origin: *\r\n"
                 f"Connection: close\r\n"
                 f"\r\n"
             )
 
-            return response_headers.encode('utf-8') + content
+            return response.encode('utf-8') + json_data
+
+        except Exception as e:
+            print(f" Error creating files index JSON: {e}")
+            return self.create_error_response(500, "Internal Server Error")
+
+    def serve_single_file(self, filepath, request=None, content_type=None):
+        try:
+            if content_type is None:
+                content_type = self.get_content_type(filepath)
+            if content_type == 'text/html':
+                content_type = 'text/html; charset=utf-8'
+
+            file_stat = os.stat(filepath)
+            compressible = is_compressible(content_type)
+            use_gzip = compressible and accepts_gzip(request)
+            if request is not None and self.is_not_modified(request, file_stat):
+                return self.create_not_modified_response(file_stat, 'gzip' if use_gzip else None)
+
+            if request is not None and request.get_header('Range') is not None:
+                response = self.serve_file_ranges(filepath, content_type, request)
+                if response is not None:
+                    return response
 
+            if use_gzip and file_stat.st_size <= self.file_cache.max_entry_size:
+                return self.serve_gzip_file(filepath, content_type, file_stat)
+
+            cached = self.file_cache.get(filepath, file_stat)
+            if cached is not None:
+                return cached
+
+            if file_stat.st_size <= self.file_cache.max_entry_size:
+                # Concurrent misses on the same file share one read
+                response = self.single_flight.do(('file', filepath), self.read_file_response, filepath, content_type)
+                if response is not None:
+                    return response
+
+            f = open(filepath, 'rb')
+            try:
+                file_stat = os.fstat(f.fileno())
+                response_headers = self.make_file_headers(file_stat, content_type)
+            except Exception:
+                f.close()
+                raise
+
+            # Large files are not read here - the open file is handed to sendfile by send_response
+            return FileResponse(response_headers, f, 0, file_stat.st_size)
+
+        except (FileNotFoundError, NotADirectoryError):
+            # Deleted since the last manifest rescan - covers the stat, the range, gzip and sendfile opens alike
+            return self.not_found_response
         except Exception as e:
             print(f" Error reading file '{filepath}': {e}")
             return self.create_error_response(500, "Internal Server Error")
 
+    def make_file_headers(self, file_stat, content_type):
+        vary = "Vary: Accept-Encoding\r\n" if is_compressible(content_type) else ""
+        return (
+            f"HTTP/1.1 200 OK\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {file_stat.st_size}\r\n"
+            f"Accept-Ranges: bytes\r\n"
+            f"ETag: {self.make_etag(file_stat)}\r\n"
+            f"Last-Modified: {formatdate(file_stat.st_mtime, usegmt=True)}\r\n"
+            f"{vary}"
+            f"Connection: close\r\n"
+            f"\r\n"
+        ).encode('utf-8')
+
+    def read_file_response(self, filepath, content_type):
+        #Read a small file into a cached response, None if it has grown past the cache limit since it was stat'ed
+        with open(filepath, 'rb') as f:
+            # fstat of the open file is what gets cached, a later change on disk bumps mtime/size
+            file_stat = os.fstat(f.fileno())
+            if file_stat.st_size > self.file_cache.max_entry_size:
+                return None
+            response = self.make_file_headers(file_stat, content_type) + f.read()
+
+        self.file_cache.put(filepath, file_stat, response)
+        return response
+
+    def serve_gzip_file(self, filepath, content_type, file_stat):
+        #Gzipped variant of a static file - compressed once, cached next to the identity response
+        cache_key = (filepath, 'gzip')
+        cached = self.file_cache.get(cache_key, file_stat)
+        if cached is not None:
+            return cached
+        # Compression is the expensive part, concurrent requests for the file wait for one thread to do it
+        return self.single_flight.do(cache_key, self.compress_file, filepath, content_type)
+
+    def compress_file(self, filepath, content_type):
+        #Read, compress and cache the gzip variant (runs once per file change, see serve_gzip_file)
+        cache_key = (filepath, 'gzip')
+        with open(filepath, 'rb') as f:
+            file_stat = os.fstat(f.fileno())
+            content = f.read()
+
+        # mtime=0 keeps the output byte-identical between compressions
+        compressed = gzip.compress(content, compresslevel=GZIP_LEVEL_STATIC, mtime=0)
+        response = (
+            f"HTTP/1.1 200 OK\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(compressed)}\r\n"
+            f"Content-Encoding: gzip\r\n"
+            f"Vary: Accept-Encoding\r\n"
+            f"ETag: {self.make_etag(file_stat, 'gzip')}\r\n"
+            f"Last-Modified: {formatdate(file_stat.st_mtime, usegmt=True)}\r\n"
+            f"Connection: close\r\n"
+            f"\r\n"
+        ).encode('utf-8') + compressed
+
+        self.file_cache.put(cache_key, file_stat, response)
+        return response
+
+    def serve_file_ranges(self, filepath, content_type, request):
+        #206 Partial Content for a Range request, None means "ignore the header and send the whole file"
+        f = open(filepath, 'rb')
+        try:
+            file_stat = os.fstat(f.fileno())
+            size = file_stat.st_size
+
+            if not self.if_range_matches(request, file_stat):
+                f.close()
+                return None
+
+            byte_ranges = parse_range_header(request.get_header('Range'), size)
+            if byte_ranges is None:
+                f.close()
+                return None
+            if not byte_ranges:
+                f.close()
+                return self.create_error_response(416, "Range Not Satisfiable",
+                                                  extra_headers=[f"Content-Range: bytes */{size}"])
+
+            validators = (
+                f"Accept-Ranges: bytes\r\n"
+                f"ETag: {self.make_etag(file_stat)}\r\n"
+                f"Last-Modified: {formatdate(file_stat.st_mtime, usegmt=True)}\r\n"
+            )
+
+            if len(byte_ranges) == 1:
+                start, end = byte_ranges[0]
+                response_headers = (
+                    f"HTTP/1.1 206 Partial Content\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {end - start + 1}\r\n"
+                    f"Content-Range: bytes {start}-{end}/{size}\r\n"
+                    f"{validators}"
+                    f"Connection: close\r\n"
+                    f"\r\n"
+                ).encode('utf-8')
+                return FileResponse(response_headers, f, start, end - start + 1)
+
+            # Several ranges - multipart/byteranges, every part still comes straight from the file
+            boundary = os.urandom(12).hex()
+            parts = []
+            content_length = 0
+            for start, end in byte_ranges:
+                part_header = (
+                    f"\r\n--{boundary}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Range: bytes {start}-{end}/{size}\r\n"
+                    f"\r\n"
+                ).encode('utf-8')
+                parts.append(part_header)
+                parts.append((start, end - start + 1))
+                content_length += len(part_header) + end - start + 1
+            closing = f"\r\n--{boundary}--\r\n".encode('utf-8')
+            parts.append(closing)
+            content_length += len(closing)
+
+            response_headers = (
+                f"HTTP/1.1 206 Partial Content\r\n"
+                f"Content-Type: multipart/byteranges; boundary={boundary}\r\n"
+                f"Content-Length: {content_length}\r\n"
+                f"{validators}"
+                f"Connection: close\r\n"
+                f"\r\n"
+            ).encode('utf-8')
+            return FileResponse(response_headers, f, parts=parts)
+
+        except Exception:
+            f.close()
+            raise
+
+    def if_range_matches(self, request, file_stat):
+        #If-Range - only honour the Range header while the client's copy is still current
+        if_range = request.get_header('If-Range')
+        if if_range is None:
+            return True
+        if_range = if_range.strip()
+        if if_range.startswith('"'):
+            return if_range == self.make_etag(file_stat)
+        return if_range == formatdate(file_stat.st_mtime, usegmt=True)
+
+    def make_etag(self, file_stat, encoding=None):
+        # Strong validator derived from size and nanosecond mtime, no need to hash the content
+        # Each content-coding is a different representation, so it gets its own tag
+        if encoding:
+            return f'"{file_stat.st_size:x}-{file_stat.st_mtime_ns:x}-{encoding}"'
+        return f'"{file_stat.st_size:x}-{file_stat.st_mtime_ns:x}"'
+
+    def is_not_modified(self, request, file_stat):
+        #Evaluate If-None-Match / If-Modified-Since, If-None-Match wins when both are present
+        if_none_match = request.get_header('If-None-Match')
+        if if_none_match is not None:
+            if if_none_match.strip() == '*':
+                return True
+            etags = (self.make_etag(file_stat), self.make_etag(file_stat, 'gzip'))
+            for tag in if_none_match.split(','):
+                tag = tag.strip()
+                # Weak comparison is fine for GET/HEAD, so a W/ prefix does not matter
+                if tag.startswith('W/'):
+                    tag = tag[2:]
+                if tag in etags:
+                    return True
+            return False
+
+        if_modified_since = request.get_header('If-Modified-Since')
+        if if_modified_since is not None:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            # HTTP dates have one second resolution
+            return int(file_stat.st_mtime) <= since
+
+        return False
+
+    def create_not_modified_response(self, file_stat, encoding=None):
+        response = (
+            f"HTTP/1.1 304 Not Modified\r\n"
+            f"ETag: {self.make_etag(file_stat, encoding)}\r\n"
+            f"Last-Modified: {formatdate(file_stat.st_mtime, usegmt=True)}\r\n"
+            f"Connection: close\r\n"
+            f"\r\n"
+        )
+        return response.encode('utf-8')
+
     def get_content_type(self, filepath):
         extension = os.path.splitext(filepath)[1].lower()
         content_types = {
@@ -351,93 +2922,246 @@ class ConcurrentHTTPServer:
         }
         return content_types.get(extension, 'application/octet-stream')
 
-    def serve_directory_listing(self, dirpath, requested_path):
+    def serve_directory_listing(self, entry, requested_path, manifest_key='', request=None):
         try:
-            items = os.listdir(dirpath)
-            items.sort()
-
-            display_path = requested_path.rstrip('/')
-
-            html_parts = [
-                '<!DOCTYPE html>',
-                '<html>',
-                '<head>',
-                '<meta charset="UTF-8">',
-                f'<title>Directory listing for {display_path or "/"}</title>',
-                '<style>',
-                "body{background:#f8f9fa;font-family:'Segoe UI',Arial,sans-serif;color:#3c4551;margin:0;min-height:100vh;display:flex;align-items:center;justify-content:center}",
-                ".container{width:90vw;max-width:640px;min-width:300px;min-height:350px;background:#fff;box-shadow:2px 4px 0 0 #2872f7;border:2px solid #2872f7;border-radius:8px;padding:0 0 20px 0;box-sizing:border-box;position:relative}",
-                "h1{color:#2872f7;text-align:center;font-weight:600;font-size:1.7em;padding:20px 0 10px 0;border-bottom:1px solid #2872f7;margin-bottom:18px}",
-                ".file-list{list-style:none;padding:0}",
-                ".file-list li{background:#f8f9fa;margin-left: 10px; margin-right: 10px; margin-top:10px; border-radius:6px;transition:background .2s;display:flex;justify-content:space-between;align-items:center;border-bottom:1px solid #c2d2f6}",
-                ".file-list li:hover{background:#dbe9fe}",
-                ".file-list a{display:block;padding:12px 16px;color:#2872f7;text-decoration:none;font-weight:500;font-size:1em}",
-                ".file-list a:hover{color:#2872f7;background:#e7f0ff;border-radius:4px}",
-                ".directory a{color:#e7b900!important}",
-                ".file-info{display:flex;justify-content:space-between;align-items:center}",
-                ".file-details{font-size:.85em;color:#8aa8dc;margin-left:20px}",
-                '</style>',
-                '</head>',
-                '<body>',
-                f'<div class="container"><h1 style = "margin-left: 10px; margin-right: 10px;" >Directory listing for /{display_path or "/"}</h1><ul class="file-list">'
-            ]
-
-            for item in items:
-                if item.startswith('.'):
-                    continue
-
-                item_path = os.path.join(dirpath, item)
-                item_url = quote(item)
-
-                if requested_path and not requested_path.endswith('/'):
-                    full_url = f"/{requested_path}/{item_url}"
-                else:
-                    full_url = f"/{requested_path}{item_url}"
-
-                if os.path.isdir(item_path):
-                    full_url += '/'
-                    icon = "📁"
-                    display_name = ' ' + item
-                    hits = '--'
-                    li_class = ' class="directory"'
-                else:
-                    icon = get_file_icon(item)
-                    display_name = ' ' + item
-                    with self.counter_lock:
-                        hits = f"{self.request_counter.get(item_path, 0)} hits"
-                    li_class = ''
-
-                html_parts.append(f'            <li{li_class}>')
-                html_parts.append(f'                <a href="{full_url}">{icon} {display_name}</a>')
-
-                html_parts.append(f'                <span style = "margin-left: 10px; margin-right: 10px;  class="hit-counter">{hits}</span>')
-                html_parts.append(f'            </li>')
-
-            html_parts.extend([
-                '        </ul>',
-                '    </div>',
-                '</body>',
-                '</html>'
-            ])
-
-            html_content = '\n'.join(html_parts)
-            content_bytes = html_content.encode('utf-8')
-
-            response = (
+            try:
+                offset, limit, sort, order = self.parse_listing_query(request.query if request else '')
+            except ValueError:
+                return self.create_error_response(400, "Bad Request")
+
+            children = self.get_listing_order(manifest_key, entry, sort, order)
+            paginated = offset > 0 or limit is not None
+            if not paginated and sort == 'name' and order == 'asc' and len(children) <= LISTING_STREAM_THRESHOLD:
+                return self.serve_cached_listing(entry, requested_path, children)
+
+            page = children[offset:offset + limit] if limit is not None else children[offset:]
+            nav = self.render_listing_nav(offset, limit, sort, order, len(children)) if paginated else ''
+            chunks = self.iter_listing_chunks(entry, requested_path, page, nav, self.request_counter.snapshot())
+
+            if len(page) <= LISTING_STREAM_THRESHOLD:
+                # A page this small is cheaper to send with a Content-Length than to stream
+                content_bytes = b''.join(chunks)
+                response = (
+                    f"HTTP/1.1 200 OK\r\n"
+                    f"Content-Type: text/html; charset=utf-8\r\n"
+                    f"Content-Length: {len(content_bytes)}\r\n"
+                    f"Connection: close\r\n"
+                    f"\r\n"
+                )
+                return response.encode('utf-8') + content_bytes
+
+            # Huge listing - the page is rendered batch by batch while it is being sent
+            chunked = request is None or request.version != 'HTTP/1.0'
+            transfer_encoding = "Transfer-Encoding: chunked\r\n" if chunked else ""
+            headers = (
                 f"HTTP/1.1 200 OK\r\n"
                 f"Content-Type: text/html; charset=utf-8\r\n"
-                f"Content-Length: {len(content_bytes)}\r\n"
+                f"{transfer_encoding}"
                 f"Connection: close\r\n"
                 f"\r\n"
             )
-
-            return response.encode('utf-8') + content_bytes
+            return StreamResponse(headers.encode('utf-8'), chunks, chunked)
 
         except Exception as e:
             print(f" Error creating directory listing: {e}")
             return self.create_error_response(500, "Internal Server Error")
 
-    def create_error_response(self, status_code, status_message):
+    def serve_cached_listing(self, entry, requested_path, children):
+        # The static part of the page only changes when the directory does, i.e. with its mtime
+        # (taken from the manifest, so a cached listing costs no syscalls at all)
+        cache_key = (entry.fs_path, requested_path)
+        template = self.listing_cache.get(cache_key, entry.mtime_ns)
+        if template is None:
+            def render():
+                rendered = self.render_listing_template(entry, requested_path, children)
+                self.listing_cache.put(cache_key, entry.mtime_ns, rendered)
+                return rendered
+
+            # A changed directory is rendered by one worker, the others reuse its template
+            template = self.single_flight.do(('listing', cache_key, entry.mtime_ns), render)
+
+        # One merged snapshot for the whole page instead of a lookup per file
+        hit_counts = self.request_counter.snapshot()
+        content_bytes = self.fill_listing_template(template, hit_counts)
+
+        response = (
+            f"HTTP/1.1 200 OK\r\n"
+            f"Content-Type: text/html; charset=utf-8\r\n"
+            f"Content-Length: {len(content_bytes)}\r\n"
+            f"Connection: close\r\n"
+            f"\r\n"
+        )
+
+        return response.encode('utf-8') + content_bytes
+
+    def parse_listing_query(self, query):
+        #offset / limit / sort / order from a listing query string, ValueError if any of them is invalid
+        params = parse_qs(query)
+
+        def single(name, default):
+            values = params.get(name)
+            return values[-1] if values else default
+
+        offset = int(single('offset', 0))
+        limit = single('limit', None)
+        limit = int(limit) if limit is not None else None
+        sort = single('sort', 'name')
+        order = single('order', 'asc')
+        if offset < 0 or (limit is not None and limit <= 0):
+            raise ValueError("offset and limit must be positive")
+        if sort not in LISTING_SORT_KEYS or order not in ('asc', 'desc'):
+            raise ValueError(f"unknown sort '{sort} {order}'")
+        return offset, limit, sort, order
+
+    def get_listing_order(self, manifest_key, entry, sort, order):
+        #Visible children of a directory in the requested order, from the manifest's scandir data
+        #Sorted orders are cached until the manifest changes, so paging through a big folder sorts it once
+        if sort == 'name' and order == 'asc' and len(entry.children) <= LISTING_STREAM_THRESHOLD:
+            return [child for child in entry.children if not child[0].startswith('.')]
+
+        cache_key = ('order', entry.fs_path, sort, order)
+        generation = self.manifest.generation
+        children = self.listing_cache.get(cache_key, generation)
+        if children is not None:
+            return children
+
+        def sort_children():
+            ordered = [child for child in entry.children if not child[0].startswith('.')]
+            if sort != 'name':
+                prefix = f"{manifest_key}/" if manifest_key else ''
+                field = 'size' if sort == 'size' else 'mtime_ns'
+
+                def sort_key(child):
+                    child_entry = self.manifest.lookup(prefix + child[0])
+                    return (getattr(child_entry, field) if child_entry is not None else 0, child[0])
+
+                ordered.sort(key=sort_key)
+            if order == 'desc':
+                ordered.reverse()
+            self.listing_cache.put(cache_key, generation, ordered)
+            return ordered
+
+        return self.single_flight.do(cache_key + (generation,), sort_children)
+
+    def render_listing_head(self, requested_path):
+        #Start of a listing page, up to the opening of the file list
+        display_path = requested_path.rstrip('/')
+
+        return '\n'.join([
+            '<!DOCTYPE html>',
+            '<html>',
+            '<head>',
+            '<meta charset="UTF-8">',
+            f'<title>Directory listing for {display_path or "/"}</title>',
+            '<style>',
+            "body{background:#f8f9fa;font-family:'Segoe UI',Arial,sans-serif;color:#3c4551;margin:0;min-height:100vh;display:flex;align-items:center;justify-content:center}",
+            ".container{width:90vw;max-width:640px;min-width:300px;min-height:350px;background:#fff;box-shadow:2px 4px 0 0 #2872f7;border:2px solid #2872f7;border-radius:8px;padding:0 0 20px 0;box-sizing:border-box;position:relative}",
+            "h1{color:#2872f7;text-align:center;font-weight:600;font-size:1.7em;padding:20px 0 10px 0;border-bottom:1px solid #2872f7;margin-bottom:18px}",
+            ".file-list{list-style:none;padding:0}",
+            ".file-list li{background:#f8f9fa;margin-left: 10px; margin-right: 10px; margin-top:10px; border-radius:6px;transition:background .2s;display:flex;justify-content:space-between;align-items:center;border-bottom:1px solid #c2d2f6}",
+            ".file-list li:hover{background:#dbe9fe}",
+            ".file-list a{display:block;padding:12px 16px;color:#2872f7;text-decoration:none;font-weight:500;font-size:1em}",
+            ".file-list a:hover{color:#2872f7;background:#e7f0ff;border-radius:4px}",
+            ".directory a{color:#e7b900!important}",
+            ".file-info{display:flex;justify-content:space-between;align-items:center}",
+            ".file-details{font-size:.85em;color:#8aa8dc;margin-left:20px}",
+            '</style>',
+            '</head>',
+            '<body>',
+            f'<div class="container"><h1 style = "margin-left: 10px; margin-right: 10px;" >Directory listing for /{display_path or "/"}</h1><ul class="file-list">'
+        ])
+
+    def render_listing_item(self, requested_path, item, kind):
+        #HTML of one entry split around its hit counter: (before, after)
+        #Directories have no counter, they come back whole as (html, None)
+        item_url = quote(item)
+
+        if requested_path and not requested_path.endswith('/'):
+            full_url = f"/{requested_path}/{item_url}"
+        else:
+            full_url = f"/{requested_path}{item_url}"
+
+        if kind == 'dir':
+            return (
+                f'\n            <li class="directory">'
+                f'\n                <a href="{full_url}/">📁  {item}</a>'
+                f'\n                <span style = "margin-left: 10px; margin-right: 10px;  class="hit-counter">--</span>'
+                f'\n            </li>'
+            ), None
+
+        return (
+            f'\n            <li>'
+            f'\n                <a href="{full_url}">{get_file_icon(item)}  {item}</a>'
+            f'\n                <span style = "margin-left: 10px; margin-right: 10px;  class="hit-counter">'
+        ), '</span>\n            </li>'
+
+    def render_listing_nav(self, offset, limit, sort, order, total):
+        #Previous / next links for a paginated listing, relative to the current directory
+        shown = min(offset + limit, total) if limit is not None else total
+        step = limit if limit is not None else total
+        links = []
+        if offset > 0:
+            links.append(f'<a href="?offset={max(offset - step, 0)}&limit={step}&sort={sort}&order={order}">&larr; Previous</a>')
+        if shown < total:
+            links.append(f'<a href="?offset={shown}&limit={step}&sort={sort}&order={order}">Next &rarr;</a>')
+        first = min(offset + 1, total)
+        return (
+            f'\n            <li class="pagination">'
+            f'\n                <span style = "margin-left: 10px; margin-right: 10px;">{first}-{shown} of {total}</span>'
+            f'\n                {" ".join(links)}'
+            f'\n            </li>'
+        )
+
+    def render_listing_footer(self):
+        return '\n        </ul>\n    </div>\n</body>\n</html>'
+
+    def fill_listing_template(self, template, hit_counts):
+        #Patch the per-file hit counts into a cached listing
+        chunks, hit_keys = template
+        parts = [chunks[0]]
+        for index, item_path in enumerate(hit_keys):
+            parts.append(f"{hit_counts.get(item_path, 0)} hits".encode('utf-8'))
+            parts.append(chunks[index + 1])
+        return b''.join(parts)
+
+    def render_listing_template(self, entry, requested_path, children):
+        #Render the listing HTML, split into static chunks around the hit counter of every file
+        #Returns (chunks, hit_keys) with len(chunks) == len(hit_keys) + 1
+        chunks = []
+        hit_keys = []
+        html_parts = [self.render_listing_head(requested_path)]
+
+        # Children come sorted from the manifest, no listdir/isdir needed
+        for item, kind in children:
+            before, after = self.render_listing_item(requested_path, item, kind)
+            html_parts.append(before)
+            if after is not None:
+                # Cut the page here, the count is filled in per request by fill_listing_template
+                chunks.append(''.join(html_parts).encode('utf-8'))
+                hit_keys.append(os.path.join(entry.fs_path, item))
+                html_parts = [after]
+
+        html_parts.append(self.render_listing_footer())
+        chunks.append(''.join(html_parts).encode('utf-8'))
+        return chunks, hit_keys
+
+    def iter_listing_chunks(self, entry, requested_path, page, nav, hit_counts):
+        #Render a listing page LISTING_BATCH_SIZE entries at a time
+        html_parts = [self.render_listing_head(requested_path)]
+        for index, (item, kind) in enumerate(page, 1):
+            before, after = self.render_listing_item(requested_path, item, kind)
+            html_parts.append(before)
+            if after is not None:
+                html_parts.append(f"{hit_counts.get(os.path.join(entry.fs_path, item), 0)} hits")
+                html_parts.append(after)
+            if index % LISTING_BATCH_SIZE == 0:
+                yield ''.join(html_parts).encode('utf-8')
+                html_parts = []
+        html_parts.append(nav)
+        html_parts.append(self.render_listing_footer())
+        yield ''.join(html_parts).encode('utf-8')
+
+    def create_error_response(self, status_code, status_message, extra_headers=None):
         html_content = (
             '<!DOCTYPE html>\n'
             '<html>\n'
@@ -463,10 +3187,12 @@ class ConcurrentHTTPServer:
             '</html>\n'
         )
 
+        extra = ''.join(f"{header}\r\n" for header in extra_headers or [])
         response = (
             f"HTTP/1.1 {status_code} {status_message}\r\n"
             f"Content-Type: text/html; charset=utf-8\r\n"
             f"Content-Length: {len(html_content)}\r\n"
+            f"{extra}"
             f"Connection: close\r\n"
             f"\r\n"
             f"{html_content}"
@@ -522,38 +3248,106 @@ class ConcurrentHTTPServer:
         print("\n" + "=" * 50)
         print(" Server Statistics")
         print("=" * 50)
-        print(f"Total requests handled: {self.total_requests}")
+        print(f"Total requests handled: {self.get_total_requests()}")
         print(f"\n File access counts:")
-        with self.counter_lock:
-            for filepath, count in sorted(self.request_counter.items(), key=lambda x: x[1], reverse=True):
-                print(f"  {os.path.basename(filepath)}: {count}")
+        for filepath, count in sorted(self.request_counter.snapshot().items(), key=lambda x: x[1], reverse=True):
+            print(f"  {os.path.basename(filepath)}: {count}")
 
         print(f"\n Rate limit blocks per IP:")
-        with self.rate_limit_lock:
-            for ip, data in self.rate_limit_data.items():
-                if data['blocked'] > 0:
-                    print(f"  {ip}: {data['blocked']} blocked requests")
+        for ip, blocked in self.rate_limiter.get_blocked_per_ip().items():
+            print(f"  {ip}: {blocked} blocked requests")
+        print(f"  Total (including evicted clients): {self.rate_limiter.get_stats()['blocked_total']}")
+
+
+def pop_option(args, name, default, cast=int):
+    #Remove "--name value" from the argument list and return the (cast) value
+    if name not in args:
+        return default
+    index = args.index(name)
+    if index + 1 >= len(args):
+        raise SystemExit(f"Missing value for {name}")
+    value = args[index + 1]
+    del args[index:index + 2]
+    return cast(value)
 
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python concurrent_server.py [thread-pool|thread-per-request] [port] [max_workers]")
+    args = sys.argv[1:]
+    processes = pop_option(args, '--processes', 1)
+    cache_mb = pop_option(args, '--cache-mb', 32)
+    keep_alive_timeout = pop_option(args, '--keep-alive-timeout', 5.0, float)
+    max_keep_alive_requests = pop_option(args, '--max-keep-alive-requests', 100)
+    max_queue = pop_option(args, '--max-queue', 100)
+    max_queue_wait = pop_option(args, '--max-queue-wait', 10.0, float)
+    max_pool_size = pop_option(args, '--max-pool-size', None)
+    target_queue_wait = pop_option(args, '--target-queue-wait', 0.1, float)
+    worker_idle_timeout = pop_option(args, '--worker-idle-timeout', 30.0, float)
+    slow_request_ms = pop_option(args, '--slow-request-ms', 1500.0, float)
+    slow_log_path = pop_option(args, '--slow-log', None, str)
+    log_level = pop_option(args, '--log-level', 'access', str)
+    access_log_path = pop_option(args, '--access-log', None, str)
+    header_timeout = pop_option(args, '--header-timeout', 10.0, float)
+    body_timeout = pop_option(args, '--body-timeout', 30.0, float)
+    send_timeout = pop_option(args, '--send-timeout', 30.0, float)
+    if log_level not in LOG_LEVELS:
+        raise SystemExit(f"Unknown --log-level '{log_level}', expected one of: {', '.join(LOG_LEVELS)}")
+    state_dir = pop_option(args, '--state-dir', None, str)
+    snapshot_interval = pop_option(args, '--snapshot-interval', 10.0, float)
+    manifest_interval = pop_option(args, '--manifest-interval', 2.0, float)
+    warmup_files = pop_option(args, '--warmup-files', 100)
+    warmup_seconds = pop_option(args, '--warmup-seconds', 5.0, float)
+    warmup_mb = pop_option(args, '--warmup-mb', 16.0, float)
+
+    if len(args) < 1:
+        print("Usage: python concurrent_server.py [thread-pool|thread-per-request|asyncio] [port] [max_workers] [--processes N] [--cache-mb MB] [--state-dir DIR] [--snapshot-interval SECONDS] [--manifest-interval SECONDS]")
+        print("       [--keep-alive-timeout SECONDS] [--max-keep-alive-requests N] [--max-queue N] [--max-queue-wait SECONDS]")
+        print("       [--max-pool-size N] [--target-queue-wait SECONDS] [--worker-idle-timeout SECONDS]")
+        print("       [--slow-request-ms MS] [--slow-log FILE] [--log-level quiet|access|debug] [--access-log FILE]")
+        print("       [--header-timeout SECONDS] [--body-timeout SECONDS] [--send-timeout SECONDS]")
+        print("       [--warmup-files N] [--warmup-seconds SECONDS] [--warmup-mb MB]")
         print("Example: python concurrent_server.py thread-pool 8000 10")
         print("Example: python concurrent_server.py thread-per-request 8000")
+        print("Example: python concurrent_server.py asyncio 8000 4")
+        print("Example: python concurrent_server.py thread-pool 8000 10 --processes 4")
+        print("Example: python concurrent_server.py thread-pool 8000 4 --max-pool-size 32")
         return
 
-    mode = sys.argv[1]
-    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8000
-    max_workers = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    mode = args[0]
+    port = int(args[1]) if len(args) > 1 else 8000
+    max_workers = int(args[2]) if len(args) > 2 else 10
 
     use_thread_pool = (mode == 'thread-pool')
+    use_asyncio = (mode == 'asyncio')
 
     server = ConcurrentHTTPServer(
         host='0.0.0.0',
         port=port,
         document_root='content',
         use_thread_pool=use_thread_pool,
-        max_workers=max_workers
+        max_workers=max_workers,
+        use_asyncio=use_asyncio,
+        processes=processes,
+        cache_max_bytes=cache_mb * 1024 * 1024,
+        state_dir=state_dir,
+        snapshot_interval=snapshot_interval,
+        manifest_interval=manifest_interval,
+        keep_alive_timeout=keep_alive_timeout,
+        max_keep_alive_requests=max_keep_alive_requests,
+        max_queue=max_queue,
+        max_queue_wait=max_queue_wait,
+        max_pool_size=max_pool_size,
+        target_queue_wait=target_queue_wait,
+        worker_idle_timeout=worker_idle_timeout,
+        slow_request_threshold=slow_request_ms / 1000,
+        slow_log_path=slow_log_path,
+        log_level=log_level,
+        access_log_path=access_log_path,
+        header_timeout=header_timeout,
+        body_timeout=body_timeout,
+        send_timeout=send_timeout,
+        warmup_files=warmup_files,
+        warmup_seconds=warmup_seconds,
+        warmup_max_bytes=int(warmup_mb * 1024 * 1024)
     )
 
     server.start_server()
@@ -2,7 +2,7 @@ import socket
 import sys
 import os
 import time
-from urllib.parse import unquote
+from urllib.parse import unquote, parse_qs
 
 class HTTPServer:
     def __init__(self, host='0.0.0.0', port=8000, document_root='content'):
@@ -33,22 +33,32 @@ class HTTPServer:
             self.server_socket.close()
 
     def handle_client(self, client_socket):
+        streaming = False
         try:
             request_data = client_socket.recv(1024).decode('utf-8')
             if not request_data:
                 client_socket.close()
                 return
-            requested_path = self.parse_request(request_data)
-            if requested_path is None:
+            parsed = self.parse_request(request_data)
+            if parsed is None:
                 response = self.create_error_response(400, "Bad Request")
                 client_socket.send(response.encode('utf-8'))
             else:
-                response = self.serve_file(requested_path)
+                requested_path, query, version = parsed
+                response = self.serve_file(requested_path, query, version)
                 if isinstance(response, bytes):
                     client_socket.send(response)
-                else:
+                elif isinstance(response, str):
                     client_socket.send(response.encode('utf-8'))
+                else:
+                    # streamed directory listing - headers first, then chunked body pieces
+                    streaming = True
+                    for chunk in response:
+                        client_socket.sendall(chunk)
         except Exception:
+            if streaming:
+                # headers are already out, a 500 now would land in the middle of the body - just close
+                return
             error_response = self.create_error_response(500, "Internal Server Error")
             try:
                 client_socket.send(error_response.encode('utf-8'))
@@ -68,18 +78,20 @@ class HTTPServer:
                 return None
             method = parts[0]
             path = parts[1]
+            version = parts[2] if len(parts) > 2 else 'HTTP/1.0'
             if method != 'GET':
                 return None
+            path, _, query = path.partition('?')
             path = unquote(path)
             if path.startswith('/'):
                 path = path[1:]
             if not path:
                 path = 'index.html'
-            return path
+            return path, query, version
         except Exception:
             return None
 
-    def serve_file(self, requested_path):
+    def serve_file(self, requested_path, query='', version='HTTP/1.1'):
         filepath = os.path.join(self.document_root, requested_path)
         abs_document_root = os.path.abspath(self.document_root)
         abs_filepath = os.path.abspath(filepath)
@@ -89,7 +101,7 @@ class HTTPServer:
             if os.path.isfile(filepath):
                 return self.serve_single_file(filepath)
             elif os.path.isdir(filepath):
-                return self.serve_directory_listing(filepath, requested_path)
+                return self.serve_directory_listing(filepath, requested_path, query, version)
             else:
                 return self.create_error_response(404, "Not Found")
         except Exception:
@@ -137,9 +149,51 @@ class HTTPServer:
         }
         return icons.get(ext, '📄')
 
-    def serve_directory_listing(self, dirpath, requested_path):
-        items = os.listdir(dirpath)
-        items.sort()
+    def serve_directory_listing(self, dirpath, requested_path, query='', version='HTTP/1.1'):
+        # ?offset=&limit= pagination and ?sort=name|size|mtime&order=asc|desc
+        params = parse_qs(query)
+        try:
+            offset = int(params.get('offset', ['0'])[-1])
+            limit = int(params['limit'][-1]) if 'limit' in params else None
+        except ValueError:
+            return self.create_error_response(400, "Bad Request")
+        sort = params.get('sort', ['name'])[-1]
+        order = params.get('order', ['asc'])[-1]
+        if offset < 0 or (limit is not None and limit <= 0) or sort not in ('name', 'size', 'mtime') or order not in ('asc', 'desc'):
+            return self.create_error_response(400, "Bad Request")
+        # scandir gives type and stat data per entry, no extra isdir/stat calls
+        with os.scandir(dirpath) as it:
+            entries = list(it)
+        if sort == 'size':
+            entries.sort(key=lambda entry: (entry.stat().st_size, entry.name))
+        elif sort == 'mtime':
+            entries.sort(key=lambda entry: (entry.stat().st_mtime, entry.name))
+        else:
+            entries.sort(key=lambda entry: entry.name)
+        if order == 'desc':
+            entries.reverse()
+        total = len(entries)
+        page = entries[offset:offset + limit] if limit is not None else entries[offset:]
+        # HTTP/1.0 clients cannot decode chunked bodies - they get a body delimited by closing the connection
+        chunked = version != 'HTTP/1.0'
+        transfer_encoding = "Transfer-Encoding: chunked\r\n" if chunked else ""
+        headers = (
+            f"HTTP/1.1 200 OK\r\n"
+            f"Content-Type: text/html; charset=utf-8\r\n"
+            f"{transfer_encoding}"
+            f"Connection: close\r\n"
+            f"\r\n"
+        )
+        return self.stream_directory_listing(headers, page, requested_path, offset, limit, sort, order, total, chunked)
+
+    def stream_directory_listing(self, headers, page, requested_path, offset, limit, sort, order, total, chunked=True):
+        # yields the headers, then the page as chunks of 256 entries (chunked transfer encoding unless chunked=False)
+        def chunk(html_parts):
+            data = '\n'.join(html_parts).encode('utf-8') + b'\n'
+            if not chunked:
+                return data
+            return f"{len(data):x}\r\n".encode('utf-8') + data + b'\r\n'
+        yield headers.encode('utf-8')
         display_path = requested_path.rstrip('/')
         html_parts = [
             '<!DOCTYPE html>',
@@ -171,37 +225,36 @@ class HTTPServer:
                 parent_path = '/'
             html_parts.append(f'<li class="directory"><a href="/{parent_path}"> Parent Directory</a></li>')
         # directory listing
-        for item in items:
-            item_path = os.path.join(dirpath, item)
-            stat_info = os.stat(item_path)
+        for index, entry in enumerate(page, 1):
+            stat_info = entry.stat()
             mod_time = time.strftime('%Y-%m-%d %H:%M', time.localtime(stat_info.st_mtime))
-            if os.path.isdir(item_path):
+            link = f"/{requested_path}/{entry.name}".replace('//', '/')
+            if entry.is_dir():
                 file_size = "-"
                 icon = "📁"
-                link = f"/{requested_path}/{item}".replace('//', '/')
                 class_name = 'directory'
             else:
                 file_size = self.format_size(stat_info.st_size)
                 icon = '📄'
-                link = f"/{requested_path}/{item}".replace('//', '/')
                 class_name = ''
             html_parts.append(
                 f'<li class="{class_name}"><a href="{link}">'
-                f'<div class="file-info"><span>{icon} {item}</span>'
+                f'<div class="file-info"><span>{icon} {entry.name}</span>'
                 f'<span class="file-details">{file_size} | {mod_time}</span></div></a></li>'
             )
+            if index % 256 == 0:
+                yield chunk(html_parts)
+                html_parts = []
+        # previous / next page links
+        if limit is not None:
+            if offset > 0:
+                html_parts.append(f'<li class="directory"><a href="?offset={max(offset - limit, 0)}&limit={limit}&sort={sort}&order={order}">&larr; Previous</a></li>')
+            if offset + limit < total:
+                html_parts.append(f'<li class="directory"><a href="?offset={offset + limit}&limit={limit}&sort={sort}&order={order}">Next &rarr;</a></li>')
         html_parts.append('</ul></div></body></html>')
-        html_content = '\n'.join(html_parts)
-        content_length = len(html_content.encode('utf-8'))
-        response = (
-            f"HTTP/1.1 200 OK\r\n"
-            f"Content-Type: text/html; charset=utf-8\r\n"
-            f"Content-Length: {content_length}\r\n"
-            f"Connection: close\r\n"
-            f"\r\n"
-            f"{html_content}"
-        )
-        return response
+        yield chunk(html_parts)
+        if chunked:
+            yield b'0\r\n\r\n'
 
     def is_allowed_extension(self, filepath):
         extension = os.path.splitext(filepath)[1].lower()
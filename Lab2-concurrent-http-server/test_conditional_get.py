@@ -0,0 +1,41 @@
+import requests
+import time
+
+SERVER_URL = "http://localhost:8000/sample2.png"
+
+
+def check(label, response, expected_status):
+    ok = response.status_code == expected_status
+    print(f"  {label:<34} {response.status_code} "
+          f"({len(response.content)} body bytes) {'OK' if ok else f'EXPECTED {expected_status}'}")
+    return ok
+
+
+print(f"Testing conditional requests against {SERVER_URL}")
+print("=" * 60)
+
+first = requests.get(SERVER_URL, timeout=10, headers={'Connection': 'close'})
+etag = first.headers.get('ETag')
+last_modified = first.headers.get('Last-Modified')
+print(f"  ETag:          {etag}")
+print(f"  Last-Modified: {last_modified}\n")
+
+# Stay under the 5 requests/second rate limit
+time.sleep(1)
+
+results = [
+    check("Plain GET", first, 200),
+    check("If-None-Match (same ETag)",
+          requests.get(SERVER_URL, timeout=10, headers={'If-None-Match': etag, 'Connection': 'close'}), 304),
+    check("If-None-Match (other ETag)",
+          requests.get(SERVER_URL, timeout=10, headers={'If-None-Match': '"stale"', 'Connection': 'close'}), 200),
+    check("If-Modified-Since (Last-Modified)",
+          requests.get(SERVER_URL, timeout=10, headers={'If-Modified-Since': last_modified, 'Connection': 'close'}), 304),
+]
+
+head = requests.head(SERVER_URL, timeout=10, headers={'Connection': 'close'})
+results.append(check("HEAD", head, 200))
+print(f"  HEAD Content-Length: {head.headers.get('Content-Length')} (GET body: {len(first.content)})")
+
+print("=" * 60)
+print(f"{sum(results)}/{len(results)} checks passed")
@@ -0,0 +1,79 @@
+import os
+import time
+import requests
+
+# Run from this directory while the server serves ./content (the check file is created and removed there)
+SERVER_URL = "http://localhost:8000/files.json"
+CHECK_FILE = os.path.join("content", "files_index_check.css")
+MANIFEST_WAIT = 3  # default --manifest-interval is 2 s
+
+
+def get(params):
+    # Stay under the 5 requests/second rate limit
+    time.sleep(0.25)
+    response = requests.get(SERVER_URL, params=params, timeout=10, headers={'Connection': 'close'})
+    response.raise_for_status()
+    return response.json()
+
+
+def check(label, ok, detail=''):
+    print(f"  {label:<44} {'OK' if ok else 'FAILED'} {detail}")
+    return ok
+
+
+def fetch_all(params):
+    #Follow next_cursor until the feed is exhausted
+    items = []
+    page = get(params)
+    items += page['items']
+    while page['next_cursor']:
+        page = get(dict(params, cursor=page['next_cursor']))
+        items += page['items']
+    return items, page['token']
+
+
+print(f"Testing the /files.json change feed at {SERVER_URL}")
+print("=" * 60)
+
+results = []
+full = get({'limit': 1000})
+paths = [item['path'] for item in full['items']]
+token = full['token']
+print(f"  {len(paths)} files, token {token}\n")
+
+paged, _ = fetch_all({'limit': 3})
+results.append(check("Cursor pages add up to the full listing", [item['path'] for item in paged] == paths,
+                     f"({len(paged)} items)"))
+
+try:
+    with open(CHECK_FILE, 'w') as f:
+        f.write("body { margin: 0; }\n")
+    time.sleep(MANIFEST_WAIT)
+
+    by_type = {}
+    for file_type in ('images', 'documents', 'other'):
+        by_type[file_type], _ = fetch_all({'type': file_type, 'limit': 1000})
+    kinds = {'images': 'image', 'documents': 'document', 'other': 'other'}
+    results.append(check("?type= returns only that type",
+                         all(item['type'] == kinds[t] for t, items in by_type.items() for item in items)))
+    results.append(check("?type=other includes the new .css file",
+                         any(item['path'] == 'files_index_check.css' for item in by_type['other'])))
+
+    changed = get({'since': token})
+    results.append(check("?since=<token> returns only the new file",
+                         [item['path'] for item in changed['items']] == ['files_index_check.css'],
+                         f"({len(changed['items'])} items)"))
+    token = changed['token']
+finally:
+    os.remove(CHECK_FILE)
+time.sleep(MANIFEST_WAIT)
+
+deleted = get({'since': token})
+results.append(check("Deletion shows up as a tombstone",
+                     [(item['path'], item.get('deleted')) for item in deleted['items']] == [('files_index_check.css', True)]))
+results.append(check("Nothing changed since the latest token", get({'since': deleted['token']})['items'] == []))
+stale = get({'since': 'another-run.' + deleted['token'].rpartition('.')[2]})
+results.append(check("Token from another server run asks for a reset", stale['reset'] and stale['items'] == []))
+
+print("=" * 60)
+print(f"{sum(results)}/{len(results)} checks passed")
@@ -0,0 +1,50 @@
+import requests
+import time
+
+SERVER_URL = "http://localhost:8000/python_syntax.pdf"
+LOCAL_FILE = "content/python_syntax.pdf"
+
+with open(LOCAL_FILE, 'rb') as f:
+    expected = f.read()
+size = len(expected)
+
+
+def get(range_header):
+    # Stay under the 5 requests/second rate limit
+    time.sleep(0.25)
+    return requests.get(SERVER_URL, timeout=10, headers={'Range': range_header, 'Connection': 'close'})
+
+
+print(f"Testing Range requests against {SERVER_URL} ({size} bytes)")
+print("=" * 60)
+results = []
+
+response = get('bytes=0-1023')
+ok = response.status_code == 206 and response.content == expected[:1024]
+print(f"  First KB:        {response.status_code} {response.headers.get('Content-Range')} {'OK' if ok else 'FAIL'}")
+results.append(ok)
+
+response = get('bytes=-500')
+ok = response.status_code == 206 and response.content == expected[-500:]
+print(f"  Last 500 bytes:  {response.status_code} {response.headers.get('Content-Range')} {'OK' if ok else 'FAIL'}")
+results.append(ok)
+
+response = get(f'bytes={size // 2}-')
+ok = response.status_code == 206 and response.content == expected[size // 2:]
+print(f"  Resume at half:  {response.status_code} {response.headers.get('Content-Range')} {'OK' if ok else 'FAIL'}")
+results.append(ok)
+
+response = get('bytes=0-99,200-299')
+ok = (response.status_code == 206
+      and response.headers.get('Content-Type', '').startswith('multipart/byteranges')
+      and expected[:100] in response.content and expected[200:300] in response.content)
+print(f"  Two ranges:      {response.status_code} {response.headers.get('Content-Type')} {'OK' if ok else 'FAIL'}")
+results.append(ok)
+
+response = get(f'bytes={size + 10}-')
+ok = response.status_code == 416 and response.headers.get('Content-Range') == f'bytes */{size}'
+print(f"  Past the end:    {response.status_code} {response.headers.get('Content-Range')} {'OK' if ok else 'FAIL'}")
+results.append(ok)
+
+print("=" * 60)
+print(f"{sum(results)}/{len(results)} checks passed")